@@ -1,6 +1,11 @@
+from stressinjector.bandwidth import BandwidthStress  # noqa: F401
 from stressinjector.cpu import CPUStress  # noqa: F401
 from stressinjector.memory import MemoryStress  # noqa: F401
-from stressinjector.models import RequestType  # noqa: F401
+from stressinjector.models import (ArrivalType, BandwidthMode,  # noqa: F401
+                                   CPUKernel, EngineType, FillStrategy,
+                                   RequestType, SaturationMode, StressorType)
+from stressinjector.plan import Plan  # noqa: F401
+from stressinjector.saturation import Saturation  # noqa: F401
 from stressinjector.url import URLStress  # noqa: F401
 
 version = "0.9"
@@ -0,0 +1,180 @@
+import logging
+import multiprocessing
+import queue
+import time
+from multiprocessing import Process
+from multiprocessing.synchronize import Event
+from typing import Any, Dict
+
+import numpy
+
+from .cgroup import LIMITS, limits
+from .controller import Controller
+from .helper import size_converter
+from .kernels import pointer_chase
+from .memory import MemoryStress
+from .models import BandwidthMode
+
+
+class BandwidthStress(Controller):
+    """`Controller` for memory bandwidth and latency stress using multiprocessing. Gets duration as user input.
+
+    >>> BandwidthStress
+
+    Large allocations alone don't load the memory bus, once the pages are resident. Each process repeatedly streams
+    over its own buffer, which is sized well beyond the last level cache, to keep the memory bus busy.
+
+    Modes:
+        - **read**: Sums the buffer as 64-bit integers.
+        - **write**: Fills the buffer with a new value on every pass.
+        - **copy**: Copies the buffer into a second buffer of the same size.
+        - **random**: Chases pointers through a random cycle over the buffer, to stress access latency.
+
+    See Also:
+        - Bandwidth is reported in GB/s per process, counting both the read and the write of a copy.
+        - Random access is reported as the load-to-use latency in nanoseconds per access. Each load depends on the
+          previous one, as in ``kernels.pointer_chase``, and the few chases advanced together stay within the memory
+          level parallelism of the core, so that each step costs a single miss. The overhead of each step is measured
+          on a cycle that fits in the L1 cache, and subtracted.
+
+    Warnings:
+        - Memory bandwidth stress is induced in real time, and slows down every co-located process on the host.
+    """
+
+    CORES = LIMITS.cpus
+    LANES = 8  # independent chases in the random mode, that overlap their misses
+    STEPS = 256  # dependent steps of each chase in every pass
+
+    def __init__(self, seconds: int = 60, mode: str = BandwidthMode.copy, workers: int = CORES,
+                 size: int = 256 * 1024 * 1024, logger: logging.Logger = None, blocking: bool = True):
+        """Instantiates the members of the class.
+
+        Args:
+            seconds: The number of seconds memory bandwidth has to be stressed. Defaults to 60.
+            mode: Access pattern of each process. Defaults to ``copy``.
+            workers: Number of processes. Defaults to the number of cores, or the CPU quota inside a container.
+            size: Size of the buffer of each process in bytes. Defaults to 256 MB.
+            logger: Custom logger.
+            blocking: Runs the stress on instantiation when ``True``, otherwise waits for ``start()``.
+        """
+        if mode not in BandwidthMode.__members__.keys():
+            raise ValueError(
+                f"\n\nbad mode: {mode}\n\nallowed: {', '.join(BandwidthMode.__members__.keys())}"
+            )
+        super().__init__(logger=logger)
+        self.seconds = seconds
+        self.mode = BandwidthMode(mode)
+        self.workers = max(int(workers), 1)
+        self.size = size - size % 8
+        self.limits = limits()
+        if self.limits.memory:
+            # a copy holds two buffers in each process, and building a random cycle takes three
+            buffers = self.workers * {BandwidthMode.copy: 2, BandwidthMode.random: 3}.get(self.mode, 1)
+            budget = int(self.limits.memory * MemoryStress.SAFETY) // buffers
+            if self.size > budget:
+                self.LOGGER.warning('Reducing the buffer of each process from %s to %s, to fit in the memory limit of '
+                                    'the container', size_converter(self.size), size_converter(budget))
+                self.size = budget - budget % 8
+        if blocking:
+            self._run()
+
+    @classmethod
+    def _overhead(cls, seconds: float = 0.5) -> float:
+        """Measures the time each step of the random mode takes on a cycle that fits in the L1 cache.
+
+        Args:
+            seconds: Seconds to measure for.
+
+        Returns:
+            float:
+            Seconds spent on each step, without waiting on the memory.
+        """
+        chase = pointer_chase(working_set=4_096, lanes=cls.LANES, steps=cls.STEPS)
+        passes, start = 0, time.perf_counter()
+        while (elapsed := time.perf_counter() - start) < seconds:
+            chase()
+            passes += 1
+        return elapsed / passes / cls.STEPS
+
+    @classmethod
+    def _stream(cls, mode: str, size: int, done: Event, results: multiprocessing.Queue, index: int) -> None:
+        """Streams over a buffer with the access pattern of the mode, until the event is set.
+
+        Args:
+            mode: Access pattern.
+            size: Size of the buffer in bytes.
+            done: Event that stops the loop, once set.
+            results: Queue to put the result of the process in.
+            index: Index of the process.
+        """
+        if mode == BandwidthMode.random:
+            chase, overhead = pointer_chase(working_set=size, lanes=cls.LANES, steps=cls.STEPS), cls._overhead()
+        else:
+            buffer = numpy.ones(size // 8, dtype=numpy.uint64)
+            target = numpy.empty_like(buffer) if mode == BandwidthMode.copy else None
+        transferred, accesses, passes = 0, 0, 0
+        start = time.perf_counter()
+        try:
+            # at least one pass, as building a large random cycle can outlast a short stress
+            while not passes or not done.is_set():
+                if mode == BandwidthMode.read:
+                    buffer.sum()
+                    transferred += size
+                elif mode == BandwidthMode.write:
+                    buffer.fill(passes)
+                    transferred += size
+                elif mode == BandwidthMode.copy:
+                    numpy.copyto(target, buffer)
+                    transferred += 2 * size
+                else:
+                    done_accesses = chase()
+                    accesses += done_accesses
+                    transferred += done_accesses * 8
+                passes += 1
+        except KeyboardInterrupt:
+            pass
+        elapsed = time.perf_counter() - start
+        results.put({
+            'index': index, 'seconds': round(elapsed, 3), 'bytes': transferred, 'passes': passes,
+            'gbps': round(transferred / elapsed / 1024 ** 3, 3) if elapsed else 0,
+            'ns_per_access': round(max(elapsed / passes / cls.STEPS - overhead, 0) * 1e9, 2) if accesses else None,
+        })
+
+    def _run(self) -> None:
+        """Initiator for stress injector.
+
+        Methods:
+            stream: To kick off stress injector on each process.
+        """
+        self.report = {'mode': self.mode.value, 'size': self.size, 'workers': {}, 'limits': self.limits.as_dict()}
+        done = multiprocessing.Event()
+        results = multiprocessing.Queue()
+        processes = [Process(target=self._stream, args=(self.mode.value, self.size, done, results, index), daemon=True)
+                     for index in range(self.workers)]
+        try:
+            self.LOGGER.info("Stressing memory bandwidth in '%s' mode with %d processes of %s each, for %d seconds",
+                             self.mode.value, self.workers, size_converter(self.size), self.seconds)
+            [process.start() for process in processes]
+            self._stop_event.wait(self.seconds)
+        except KeyboardInterrupt:
+            self.LOGGER.warning('Manual interrupt received. Stopping stress.')
+        finally:
+            done.set()
+        workers: Dict[int, Dict[str, Any]] = {}
+        for _ in processes:
+            try:
+                result = results.get(timeout=30)
+            except queue.Empty:
+                break
+            workers[result.pop('index')] = result
+        [process.join(timeout=5) for process in processes]
+        [process.terminate() for process in processes if process.is_alive()]
+        self.report['workers'] = dict(sorted(workers.items()))
+        self.report['gbps'] = round(sum(result['gbps'] for result in workers.values()), 3)
+        self.LOGGER.info('Memory Bandwidth Report:')
+        for index, result in self.report['workers'].items():
+            line = f"Process {index + 1} - {result['gbps']} GB/s"
+            if result['ns_per_access'] is not None:
+                line += f" - {result['ns_per_access']} ns/access"
+            print(line)
+        print(f"Total - {self.report['gbps']} GB/s")
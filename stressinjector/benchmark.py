@@ -0,0 +1,307 @@
+import asyncio
+import logging
+import math
+import multiprocessing
+import platform
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Sequence, Tuple
+
+import psutil
+
+from .cgroup import LIMITS
+from .cpu import CPUStress
+from .memory import MemoryStress
+from .models import LOGGER, EngineType, FillStrategy
+from .url import URLStress
+
+# Body of each response from the stand-in server, small enough to keep the focus on the overhead of the client.
+_BODY = b'ok'
+_RESPONSE = b'HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nContent-Length: %d\r\n\r\n%s' % (len(_BODY), _BODY)
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """Responds to each request on a keep-alive connection with the same response, until the client disconnects.
+
+    Args:
+        reader: Stream to read the requests from.
+        writer: Stream to write the responses to.
+    """
+    try:
+        while True:
+            head = await reader.readuntil(b'\r\n\r\n')
+            for line in head.split(b'\r\n'):
+                name, _, value = line.partition(b':')
+                if name.strip().lower() == b'content-length' and (length := int(value)):
+                    await reader.readexactly(length)
+            writer.write(_RESPONSE)
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+def _serve(ports: multiprocessing.Queue) -> None:
+    """Runs the stand-in server on a free port of the loopback interface, until the process is terminated.
+
+    Args:
+        ports: Queue to put the port in, once the server is listening.
+    """
+    async def main() -> None:
+        """Starts the server and reports its port."""
+        server = await asyncio.start_server(_handle, '127.0.0.1', 0, backlog=1024)
+        ports.put(server.sockets[0].getsockname()[1])
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(main())
+
+
+class StandIn:
+    """Local HTTP server, that stands in for a service with a fixed response and no work per request.
+
+    >>> StandIn
+
+    The server runs on an event loop in its own process, so that it does not compete with the client for the GIL.
+    """
+
+    def __init__(self):
+        """Instantiates the members of the class."""
+        self.url = None
+        self._process = None
+
+    def __enter__(self) -> "StandIn":
+        """Starts the server and waits for it to listen."""
+        ports = multiprocessing.Queue()
+        self._process = multiprocessing.Process(target=_serve, args=(ports,), daemon=True)
+        self._process.start()
+        self.url = f'http://127.0.0.1:{ports.get(timeout=10)}/'
+        return self
+
+    def __exit__(self, *args) -> None:
+        """Stops the server."""
+        self._process.terminate()
+        self._process.join()
+
+
+def url(target: str, engine: str, requests: int, concurrency: int, processes: int = 1,
+        logger: logging.Logger = None) -> Dict[str, Any]:
+    """Measures the maximum throughput of an engine, and the CPU time the client spends on each request.
+
+    Args:
+        target: URL of the stand-in server.
+        engine: Engine to benchmark.
+        requests: Number of requests to send.
+        concurrency: Number of requests in flight.
+        processes: Number of processes to shard the requests across.
+        logger: Custom logger.
+
+    Returns:
+        dict:
+        Requests per second, client CPU time per request in microseconds, and the latency distribution.
+
+    See Also:
+        The requests are sent in the closed model, so the throughput is the maximum the engine sustains against a
+        server that does no work. The CPU time includes the processes of the shards.
+    """
+    process = psutil.Process()
+    before = process.cpu_times()
+    stress = URLStress(url=target, rate=requests, concurrency=concurrency, engine=engine, processes=processes,
+                       logger=logger)
+    after = process.cpu_times()
+    cpu = (after.user - before.user + after.system - before.system +
+           after.children_user - before.children_user + after.children_system - before.children_system)
+    sent = stress.report['success'] + stress.report['errors']
+    return {'engine': engine, 'processes': processes, 'concurrency': concurrency, 'requests': sent,
+            'errors': stress.report['errors'], 'rps': stress.report['throughput'],
+            'cpu_per_request_us': round(cpu / sent * 1e6, 2) if sent else None,
+            'latency': stress.report['latency']}
+
+
+def memory(gigabytes: float, strategy: str, logger: logging.Logger = None) -> Dict[str, Any]:
+    """Measures the rate at which a fill strategy allocates and touches memory.
+
+    Args:
+        gigabytes: Number of gigabytes to fill.
+        strategy: Fill strategy to benchmark.
+        logger: Custom logger.
+
+    Returns:
+        dict:
+        Bytes filled and the fill rate in GB/s.
+    """
+    stress = MemoryStress(gigabytes=gigabytes, strategy=strategy, logger=logger)
+    return {'strategy': strategy, 'workers': stress.workers, 'stressed': stress.report['stressed'],
+            'fill_rate': stress.report['fill_rate']}
+
+
+def _busy(times: Sequence[Any]) -> Tuple[float, float]:
+    """Returns the busy and the total CPU time of a core.
+
+    Args:
+        times: CPU times of the core from ``psutil.cpu_times``.
+    """
+    # guest time is already accounted in user time
+    total = sum(times) - getattr(times, 'guest', 0) - getattr(times, 'guest_nice', 0)
+    return total - times.idle - getattr(times, 'iowait', 0), total
+
+
+def cpu(seconds: float, percent: float, settle: float = 1.0, logger: logging.Logger = None) -> Dict[str, Any]:
+    """Measures how closely the CPU stress holds the requested duration and utilization.
+
+    Args:
+        seconds: Number of seconds to stress the CPU.
+        percent: Target utilization.
+        settle: Seconds to let the duty cycle settle, before the utilization is measured.
+        logger: Custom logger.
+
+    Returns:
+        dict:
+        Requested and actual duration and utilization, along with their errors.
+
+    See Also:
+        The utilization is the busy share of the stressed cores, read from ``psutil.cpu_times``, between the end of the
+        settling time and a second before the end of the stress.
+    """
+    stress = CPUStress(seconds=seconds, percent=percent, logger=logger, blocking=False).start()
+    while stress.start_time is None and stress.running:
+        time.sleep(0.01)
+    if stress.start_time is None:
+        raise RuntimeError("CPU stress exited before it started")
+    cores = list(stress.targets)
+    time.sleep(settle)
+    before = psutil.cpu_times(percpu=True)
+    time.sleep(max(seconds - settle - 1, 0.5))
+    after = psutil.cpu_times(percpu=True)
+    report = stress.wait()
+    levels = []
+    for core in cores:
+        (busy_before, total_before), (busy_after, total_after) = _busy(before[core]), _busy(after[core])
+        levels.append((busy_after - busy_before) * 100 / ((total_after - total_before) or 1))
+    level = sum(levels) / len(levels)
+    return {'seconds': seconds, 'run_time': round(report['run_time'], 3),
+            'duration_error': round(report['run_time'] - seconds, 3), 'percent': percent, 'level': round(level, 2),
+            'level_error': round(level - percent, 2)}
+
+
+def run(requests: int = 20_000, concurrency: int = 64, engines: Sequence[str] = tuple(EngineType.__members__),
+        processes: Sequence[int] = (1,), gigabytes: float = 0.5,
+        strategies: Sequence[str] = tuple(FillStrategy.__members__), cpu_seconds: float = 5,
+        levels: Sequence[float] = (50, 100), logger: logging.Logger = None) -> Dict[str, Any]:
+    """Runs the benchmark suite against local stand-ins.
+
+    Args:
+        requests: Number of requests to send with each engine.
+        concurrency: Number of requests in flight.
+        engines: URL engines to benchmark.
+        processes: Number of processes to benchmark each engine with.
+        gigabytes: Number of gigabytes to fill with each strategy.
+        strategies: Memory fill strategies to benchmark.
+        cpu_seconds: Number of seconds to stress the CPU at each level.
+        levels: CPU utilization levels to benchmark.
+        logger: Custom logger.
+
+    Returns:
+        dict:
+        Details of the host, followed by the results of the ``url``, ``memory`` and ``cpu`` benchmarks.
+    """
+    from . import version
+
+    logger = logger or LOGGER
+    for name, values, allowed in (('engines', engines, EngineType), ('strategies', strategies, FillStrategy)):
+        if bad := [value for value in values if value not in allowed.__members__.keys()]:
+            raise ValueError(f"\n\nbad {name}: {', '.join(bad)}\n\nallowed: {', '.join(allowed.__members__.keys())}")
+    report = {
+        'version': version, 'started': datetime.now().astimezone().isoformat(timespec='seconds'),
+        'python': platform.python_version(), 'platform': platform.platform(), 'cpus': LIMITS.cpus,
+        'memory': psutil.virtual_memory().total, 'limits': LIMITS.as_dict(), 'url': [], 'memory_fill': [], 'cpu': []
+    }
+    if engines and requests:
+        with StandIn() as server:
+            for engine in engines:
+                for count in processes:
+                    logger.info("Benchmarking '%s' engine with %d process(es)", engine, count)
+                    report['url'].append(url(target=server.url, engine=engine, requests=requests,
+                                             concurrency=concurrency, processes=count, logger=logger))
+    for strategy in strategies if gigabytes else ():
+        logger.info("Benchmarking '%s' memory fill", strategy)
+        report['memory_fill'].append(memory(gigabytes=gigabytes, strategy=strategy, logger=logger))
+    for percent in levels if cpu_seconds else ():
+        logger.info("Benchmarking CPU stress at %s%%", percent)
+        report['cpu'].append(cpu(seconds=cpu_seconds, percent=percent, logger=logger))
+    return report
+
+
+def _flatten(report: Any, prefix: str = '') -> Dict[str, float]:
+    """Flattens the numbers within a report into paths, using the engine, strategy or level to key the lists.
+
+    Args:
+        report: Report or a part of it.
+        prefix: Path of the part.
+
+    Returns:
+        Dict[str, float]:
+        Number at each path.
+    """
+    if isinstance(report, dict):
+        values = {}
+        for key, value in report.items():
+            values.update(_flatten(value, f'{prefix}.{key}' if prefix else key))
+        return values
+    if isinstance(report, list):
+        values = {}
+        for entry in report:
+            key = '/'.join(str(entry[name]) for name in ('engine', 'processes', 'strategy', 'percent')
+                           if isinstance(entry, dict) and name in entry)
+            values.update(_flatten(entry, f'{prefix}[{key}]'))
+        return values
+    if isinstance(report, (int, float)) and not isinstance(report, bool):
+        return {prefix: report}
+    return {}
+
+
+# Figures of merit that are compared between runs, along with whether a higher value is better.
+FIGURES = {'rps': True, 'cpu_per_request_us': False, 'p99': False, 'fill_rate': True, 'duration_error': False,
+           'level_error': False}
+# Errors are compared by their magnitude in their own units, along with the change that is tolerated, as seconds and
+# percentage points.
+ABSOLUTE = {'duration_error': 0.05, 'level_error': 2.0}
+# Relative tolerance of the tail latency, which is noisier between runs than the other figures.
+P99_TOLERANCE = 0.5
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.1) -> List[Dict[str, Any]]:
+    """Compares the figures of merit of a benchmark against a baseline, such as the run of the previous release.
+
+    Args:
+        current: Report of the current run.
+        baseline: Report of the baseline run.
+        tolerance: Share by which a figure can get worse, before it is flagged as a regression.
+
+    Returns:
+        List[Dict[str, Any]]:
+        Path, baseline and current value, change and regression flag of each figure in both runs.
+
+    See Also:
+        Errors are compared by their magnitude, so that overshooting and undershooting a target are treated alike, and
+        their change is absolute, in seconds and percentage points, and tolerated up to the ``ABSOLUTE`` value. The p99
+        latency is tolerated up to the wider ``P99_TOLERANCE``, and the other figures up to the ``tolerance``.
+    """
+    old, new = _flatten(baseline), _flatten(current)
+    rows = []
+    for path in sorted(old.keys() & new.keys()):
+        figure = path.rsplit('.', 1)[-1]
+        if figure not in FIGURES:
+            continue
+        before, after = old[path], new[path]
+        if figure in ABSOLUTE:
+            change = abs(after) - abs(before)
+            rows.append({'path': path, 'baseline': before, 'current': after, 'change': round(change, 4),
+                         'absolute': True, 'regression': change > ABSOLUTE[figure]})
+            continue
+        change = (after - before) / before if before else (0.0 if after == before else math.inf)
+        worse = -change if FIGURES[figure] else change
+        rows.append({'path': path, 'baseline': before, 'current': after, 'change': round(change, 4),
+                     'absolute': False, 'regression': worse > (P99_TOLERANCE if figure == 'p99' else tolerance)})
+    return rows
@@ -0,0 +1,241 @@
+import math
+import os
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import psutil
+
+from .models import operating_system, settings
+
+# Values at or above this are used by cgroup v1 to mean no memory limit.
+_UNLIMITED = 1 << 62
+
+
+class CgroupLimits(NamedTuple):
+    """Wrapper for the resource limits of the control group the current process runs in.
+
+    >>> CgroupLimits
+
+    Each limit is ``None`` when it is not set, or when it cannot be read on the current system.
+    """
+
+    version: Optional[int]
+    cpu_quota: Optional[float]
+    cpuset: Optional[List[int]]
+    memory_max: Optional[int]
+    memory_high: Optional[int]
+
+    @property
+    def cores(self) -> List[int]:
+        """Logical cores the process can run on, from the cpuset and the CPU affinity."""
+        if hasattr(os, 'sched_getaffinity'):
+            available = os.sched_getaffinity(0)
+        else:
+            available = set(range(os.cpu_count() or 1))
+        if self.cpuset:
+            available = available.intersection(self.cpuset) or available
+        return sorted(available)
+
+    @property
+    def cpus(self) -> int:
+        """Number of cores worth of CPU time the process can use, from the cores available and the CPU quota."""
+        cores = len(self.cores)
+        if self.cpu_quota:
+            return max(min(cores, math.ceil(self.cpu_quota)), 1)
+        return cores
+
+    @property
+    def memory(self) -> Optional[int]:
+        """Bytes of memory the process can use before it is throttled or killed, if lower than the physical memory."""
+        limits = [limit for limit in (self.memory_max, self.memory_high) if limit is not None]
+        if limits and (limit := min(limits)) < psutil.virtual_memory().total:
+            return limit
+        return None
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Returns the limits along with the effective number of CPUs and bytes of memory, to be used in reports."""
+        return dict(self._asdict(), cpus=self.cpus, memory=self.memory)
+
+
+def _parse_cpus(text: str) -> List[int]:
+    """Parses a list of cores in the cpuset format, like ``0-3,6``.
+
+    Args:
+        text: Cores in the cpuset format.
+
+    Returns:
+        List[int]:
+        Sorted list of cores.
+    """
+    cores = set()
+    for part in text.strip().split(','):
+        if not part:
+            continue
+        start, _, end = part.partition('-')
+        cores.update(range(int(start), int(end or start) + 1))
+    return sorted(cores)
+
+
+def _read(directory: str, name: str) -> Optional[str]:
+    """Reads a file within a cgroup directory.
+
+    Args:
+        directory: Cgroup directory.
+        name: Name of the file.
+
+    Returns:
+        str:
+        Content of the file, or ``None`` if it cannot be read.
+    """
+    try:
+        with open(os.path.join(directory, name)) as file:
+            return file.read().strip()
+    except OSError:
+        return None
+
+
+def _groups() -> Tuple[Optional[int], Dict[str, Tuple[str, str]]]:
+    """Finds the cgroup directory of the current process, and the mount point it is under, for each controller.
+
+    Returns:
+        Tuple[Optional[int], Dict[str, Tuple[str, str]]]:
+        Cgroup version, and the directory along with its mount point for the ``cpu``, ``cpuset`` and ``memory``
+        controllers.
+
+    See Also:
+        Controllers mounted as cgroup v1 take precedence over the unified cgroup v2 hierarchy on hybrid systems. When
+        the path in ``/proc/self/cgroup`` does not exist under the mount point, as in containers without a cgroup
+        namespace, the mount point itself is the group of the process.
+    """
+    try:
+        with open('/proc/self/cgroup') as file:
+            memberships = [line.rstrip('\n').split(':', 2) for line in file if line.count(':') >= 2]
+        with open('/proc/self/mountinfo') as file:
+            mounts = [line.split() for line in file]
+    except OSError:
+        return None, {}
+    v1_mounts, v2_mount = {}, None
+    for fields in mounts:
+        separator = fields.index('-')
+        kind, options = fields[separator + 1], fields[separator + 3].split(',')
+        if kind == 'cgroup':
+            for controller in options:
+                v1_mounts[controller] = (fields[3], fields[4])
+        elif kind == 'cgroup2':
+            v2_mount = (fields[3], fields[4])
+    v1_paths, v2_path = {}, None
+    for hierarchy, controllers, path in memberships:
+        if hierarchy == '0' and not controllers:
+            v2_path = path
+        for controller in controllers.split(','):
+            v1_paths[controller] = path
+
+    def locate(mount: Tuple[str, str], path: str) -> Tuple[str, str]:
+        """Resolves the path of a group against the root and the mount point of its hierarchy."""
+        root, mount_point = mount
+        relative = os.path.relpath(path, root) if path.startswith(root) else path.lstrip('/')
+        directory = os.path.normpath(os.path.join(mount_point, relative))
+        return (directory if os.path.isdir(directory) else mount_point), mount_point
+
+    groups, version = {}, None
+    v2_controllers = (_read(v2_mount[1], 'cgroup.controllers') or '').split() if v2_mount else []
+    for controller in ('cpu', 'cpuset', 'memory'):
+        if controller in v1_mounts and controller in v1_paths:
+            groups[controller] = locate(v1_mounts[controller], v1_paths[controller])
+            version = 1
+        elif v2_mount and v2_path is not None and controller in v2_controllers:
+            groups[controller] = locate(v2_mount, v2_path)
+            version = version or 2
+    return version, groups
+
+
+def _ancestors(group: Tuple[str, str]) -> Iterator[str]:
+    """Yields the directory of a group, followed by each of its parents up to the mount point.
+
+    Args:
+        group: Directory of the group and its mount point.
+    """
+    directory, mount_point = group
+    while True:
+        yield directory
+        if directory == mount_point or len(directory) <= len(mount_point):
+            return
+        directory = os.path.dirname(directory)
+
+
+def _memory_value(text: Optional[str]) -> Optional[int]:
+    """Converts a memory limit into bytes.
+
+    Args:
+        text: Content of a memory limit file.
+
+    Returns:
+        int:
+        Number of bytes, or ``None`` if there is no limit.
+    """
+    if not text or text == 'max' or int(text) >= _UNLIMITED:
+        return None
+    return int(text)
+
+
+def _lowest(values: Iterator[Optional[float]]) -> Optional[float]:
+    """Returns the lowest value that is set, since a group is bound by the limits of all its parents."""
+    return min((value for value in values if value is not None), default=None)
+
+
+def limits() -> CgroupLimits:
+    """Reads the CPU quota, the cpuset and the memory limits of the control group the current process runs in.
+
+    Returns:
+        CgroupLimits:
+        Limits of the control group, which are all ``None`` on systems without cgroups.
+    """
+    if settings.os != operating_system.linux:
+        return CgroupLimits(version=None, cpu_quota=None, cpuset=None, memory_max=None, memory_high=None)
+    version, groups = _groups()
+    cpu_quota = cpuset = memory_max = memory_high = None
+    if cpu := groups.get('cpu'):
+        def quota(directory: str) -> Optional[float]:
+            """Reads the CPU quota of a single group in cores."""
+            if version == 1:
+                value, period = _read(directory, 'cpu.cfs_quota_us'), _read(directory, 'cpu.cfs_period_us')
+            else:
+                value, _, period = (_read(directory, 'cpu.max') or 'max').partition(' ')
+            if not value or value in ('max', '-1') or not period:
+                return None
+            return int(value) / int(period)
+
+        cpu_quota = _lowest(map(quota, _ancestors(cpu)))
+    if group := groups.get('cpuset'):
+        names = ('cpuset.effective_cpus', 'cpuset.cpus') if version == 1 else ('cpuset.cpus.effective',)
+        for name in names:
+            if text := _read(group[0], name):
+                cpuset = _parse_cpus(text)
+                break
+    if group := groups.get('memory'):
+        if version == 1:
+            memory_max = _lowest(_memory_value(_read(directory, 'memory.limit_in_bytes'))
+                                 for directory in _ancestors(group))
+        else:
+            memory_max = _lowest(_memory_value(_read(directory, 'memory.max')) for directory in _ancestors(group))
+            memory_high = _lowest(_memory_value(_read(directory, 'memory.high')) for directory in _ancestors(group))
+    return CgroupLimits(version=version, cpu_quota=cpu_quota, cpuset=cpuset, memory_max=memory_max,
+                        memory_high=memory_high)
+
+
+def memory_usage() -> Optional[int]:
+    """Reads the memory currently charged to the control group of the current process.
+
+    Returns:
+        int:
+        Number of bytes, or ``None`` if the usage cannot be read.
+    """
+    if settings.os != operating_system.linux:
+        return None
+    version, groups = _groups()
+    if not (group := groups.get('memory')):
+        return None
+    text = _read(group[0], 'memory.usage_in_bytes' if version == 1 else 'memory.current')
+    return int(text) if text else None
+
+
+LIMITS = limits()
@@ -0,0 +1,158 @@
+import argparse
+import json
+import re
+import sys
+import time
+from contextlib import ExitStack, redirect_stdout
+from typing import Any, Dict, List
+
+from . import benchmark as suite
+from .metrics import JSONLWriter, PrometheusExporter
+from .models import EngineType, FillStrategy
+from .plan import Plan, load
+
+
+def _serialize(value: Any) -> Any:
+    """Converts the values in a report that are not supported by ``json``, such as numpy scalars and enums."""
+    if hasattr(value, 'item'):
+        return value.item()
+    if hasattr(value, 'value'):
+        return value.value
+    return str(value)
+
+
+def run(args: argparse.Namespace) -> int:
+    """Runs a plan, and writes the combined report as JSON.
+
+    Args:
+        args: Arguments of the ``run`` command.
+
+    Returns:
+        int:
+        Exit code, which is 1 if the plan or any of its stressors failed.
+    """
+    plan = Plan(plan=load(args.plan), blocking=False)
+    with ExitStack() as exporters:
+        if args.metrics_port is not None:
+            exporter = exporters.enter_context(PrometheusExporter(port=args.metrics_port, host=args.metrics_host))
+            plan.LOGGER.info("Serving metrics on http://%s:%d/metrics", exporter.host, exporter.port)
+        if args.metrics_file:
+            exporters.enter_context(JSONLWriter(filename=args.metrics_file, interval=args.metrics_interval))
+        # the stressors print their reports, which are kept out of the JSON written to stdout
+        with redirect_stdout(sys.stderr):
+            plan.start()
+            try:
+                while plan.wait(timeout=0.5) is None:
+                    pass
+            except KeyboardInterrupt:
+                plan.stop()
+                plan.wait()
+    output = args.output or f"{re.sub(r'[^A-Za-z0-9_.-]+', '_', plan.name)}_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    _write(plan.report, output)
+    if output != '-':
+        plan.LOGGER.info("Report written to %s", output)
+    failed = [stressor['name'] for phase in plan.report.get('phases', []) for stressor in phase['stressors']
+              if 'error' in stressor]
+    if failed:
+        plan.LOGGER.error("Stressors failed: %s", ', '.join(failed))
+    return int(plan.error is not None or bool(failed))
+
+
+def _write(report: Dict[str, Any], output: str) -> None:
+    """Writes a report as JSON.
+
+    Args:
+        report: Report to write.
+        output: File to write to, or ``-`` for stdout.
+    """
+    if output == '-':
+        json.dump(report, sys.stdout, indent=2, default=_serialize)
+        sys.stdout.write('\n')
+    else:
+        with open(output, 'w') as file:
+            json.dump(report, file, indent=2, default=_serialize)
+
+
+def benchmark(args: argparse.Namespace) -> int:
+    """Runs the benchmark suite, writes the results as JSON, and compares them against a baseline if given.
+
+    Args:
+        args: Arguments of the ``benchmark`` command.
+
+    Returns:
+        int:
+        Exit code, which is 1 if a figure regressed beyond the tolerance from the baseline.
+    """
+    # the stressors print their reports, which are kept out of the JSON written to stdout
+    with redirect_stdout(sys.stderr):
+        report = suite.run(requests=args.requests, concurrency=args.concurrency, engines=args.engines,
+                           processes=args.processes, gigabytes=args.gigabytes, strategies=args.strategies,
+                           cpu_seconds=args.cpu_seconds, levels=args.levels)
+    output = args.output or f"benchmark_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    _write(report, output)
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as file:
+        rows = suite.compare(current=report, baseline=json.load(file), tolerance=args.tolerance)
+    for row in rows:
+        change = f"{row['change']:+}" if row['absolute'] else f"{row['change']:+.1%}"
+        sys.stderr.write(f"{'REGRESSION' if row['regression'] else 'ok':<10} {row['path']} - {row['baseline']} -> "
+                         f"{row['current']} ({change})\n")
+    return int(any(row['regression'] for row in rows))
+
+
+def parser() -> argparse.ArgumentParser:
+    """Builds the parser for the command line arguments.
+
+    Returns:
+        argparse.ArgumentParser:
+        Parser with a sub-command for each action.
+    """
+    root = argparse.ArgumentParser(prog='stressinjector', description='Inject memory, CPU and URL stress.')
+    commands = root.add_subparsers(dest='command', required=True)
+    runner = commands.add_parser('run', help='run a stress plan from a JSON or YAML file')
+    runner.add_argument('plan', help='plan file, YAML for the .yaml and .yml extensions and JSON otherwise')
+    runner.add_argument('-o', '--output', help="file for the JSON report, '-' for stdout. "
+                                               "Defaults to <plan name>_<timestamp>.json")
+    runner.add_argument('--metrics-port', type=int, help='serves live metrics in the Prometheus format on this port')
+    runner.add_argument('--metrics-host', default='127.0.0.1', help='interface for the metrics endpoint. '
+                                                                    'Defaults to 127.0.0.1')
+    runner.add_argument('--metrics-file', help='appends snapshots of the live metrics to this JSON lines file')
+    runner.add_argument('--metrics-interval', type=float, default=1.0, help='seconds between the snapshots in the '
+                                                                            'metrics file. Defaults to 1')
+    runner.set_defaults(handler=run)
+    bench = commands.add_parser('benchmark', help="benchmark the injector's own throughput and precision")
+    bench.add_argument('-o', '--output', help="file for the JSON results, '-' for stdout. "
+                                              "Defaults to benchmark_<timestamp>.json")
+    bench.add_argument('--baseline', help='results of a previous run to compare against, exits with 1 on a regression')
+    bench.add_argument('--tolerance', type=float, default=0.1, help='share by which a figure can get worse before it '
+                                                                    'is a regression, other than the errors and the '
+                                                                    'p99 latency. Defaults to 0.1')
+    bench.add_argument('--requests', type=int, default=20_000, help='requests to send with each engine, 0 to skip')
+    bench.add_argument('--concurrency', type=int, default=64, help='requests in flight. Defaults to 64')
+    bench.add_argument('--engines', nargs='*', default=list(EngineType.__members__), help='URL engines to benchmark')
+    bench.add_argument('--processes', nargs='+', type=int, default=[1], help='process counts to benchmark each '
+                                                                             'engine with. Defaults to 1')
+    bench.add_argument('--gigabytes', type=float, default=0.5, help='gigabytes to fill with each strategy, 0 to skip')
+    bench.add_argument('--strategies', nargs='*', default=list(FillStrategy.__members__),
+                       help='memory fill strategies to benchmark')
+    bench.add_argument('--cpu-seconds', type=float, default=5, help='seconds to stress the CPU at each level, '
+                                                                    '0 to skip')
+    bench.add_argument('--levels', nargs='*', type=float, default=[50, 100], help='CPU utilization levels to '
+                                                                                  'benchmark. Defaults to 50 100')
+    bench.set_defaults(handler=benchmark)
+    return root
+
+
+def main(argv: List[str] = None) -> int:
+    """Entry point for the ``stressinjector`` command.
+
+    Args:
+        argv: Command line arguments. Defaults to ``sys.argv``.
+
+    Returns:
+        int:
+        Exit code.
+    """
+    args = parser().parse_args(argv)
+    return args.handler(args)
@@ -0,0 +1,239 @@
+import asyncio
+import functools
+import json
+import socket
+import ssl
+import time
+import urllib.parse
+from typing import Dict, NamedTuple, Optional, Tuple
+
+SUPPORTED_KWARGS = ('params', 'headers', 'data', 'json', 'verify')
+
+
+class PreparedRequest(NamedTuple):
+    """Wrapper for a request that is serialized once, and written as is on every send."""
+
+    method: str
+    host: str
+    port: int
+    ssl: Optional[ssl.SSLContext]
+    payload: bytes
+
+    @property
+    def origin(self) -> Tuple[str, int, bool]:
+        """Host, port and scheme a connection for the request has to be opened to."""
+        return self.host, self.port, self.ssl is not None
+
+
+class Response(NamedTuple):
+    """Wrapper for the parts of a response that are recorded, with the time to first byte and body in seconds."""
+
+    status: int
+    reason: str
+    size: int
+    ttfb: float = 0.0
+    body: float = 0.0
+
+
+@functools.lru_cache(maxsize=2)
+def _context(verify: bool) -> ssl.SSLContext:
+    """Creates an SSL context once, since loading the certificates is expensive.
+
+    Args:
+        verify: Verifies the certificate and the hostname of the server.
+
+    Returns:
+        ssl.SSLContext:
+        Context shared by all the connections.
+    """
+    context = ssl.create_default_context()
+    if not verify:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def prepare(method: str, url: str, **kwargs) -> PreparedRequest:
+    """Serializes a request into HTTP/1.1 wire format, from the same keyword arguments as ``requests``.
+
+    Args:
+        method: HTTP method.
+        url: URL to send the request to.
+        kwargs: Supports ``params``, ``headers``, ``data``, ``json`` and ``verify``.
+
+    Returns:
+        PreparedRequest:
+        Request that is ready to be written on a connection.
+    """
+    if unsupported := set(kwargs) - set(SUPPORTED_KWARGS):
+        raise ValueError(
+            f"\n\nbad keyword arguments for the asyncio engine: {', '.join(sorted(unsupported))}\n\n"
+            f"allowed: {', '.join(SUPPORTED_KWARGS)}"
+        )
+    parsed = urllib.parse.urlsplit(url)
+    if parsed.scheme not in ('http', 'https'):
+        raise ValueError(f"\n\nbad url for the asyncio engine: {url}\n\nallowed schemes: http, https")
+    secure = parsed.scheme == 'https'
+    context = _context(verify=kwargs.get('verify') is not False) if secure else None
+    target = parsed.path or '/'
+    query = parsed.query
+    if params := kwargs.get('params'):
+        query = '&'.join(filter(None, (query, urllib.parse.urlencode(params, doseq=True))))
+    if query:
+        target += '?' + query
+    headers = {'Host': parsed.netloc, 'User-Agent': 'stress-injector', 'Accept': '*/*', 'Connection': 'keep-alive'}
+    body = b''
+    if kwargs.get('json') is not None:
+        body = json.dumps(kwargs['json']).encode()
+        headers['Content-Type'] = 'application/json'
+    elif (data := kwargs.get('data')) is not None:
+        if isinstance(data, dict):
+            body = urllib.parse.urlencode(data, doseq=True).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        else:
+            body = data.encode() if isinstance(data, str) else bytes(data)
+    if body or method.upper() in ('POST', 'PUT', 'PATCH'):
+        headers['Content-Length'] = str(len(body))
+    headers.update(kwargs.get('headers') or {})
+    head = f"{method.upper()} {target} HTTP/1.1\r\n" + ''.join(f'{key}: {value}\r\n' for key, value in headers.items())
+    return PreparedRequest(method=method.upper(), host=parsed.hostname, port=parsed.port or (443 if secure else 80),
+                           ssl=context, payload=head.encode('latin-1') + b'\r\n' + body)
+
+
+class Connection:
+    """Keep-alive HTTP/1.1 connection over asyncio streams.
+
+    >>> Connection
+
+    Bodies are read and discarded without being decoded, since only the status and the size are recorded.
+
+    See Also:
+        The connection is opened in separate steps, to time the DNS lookup, the TCP connect and the TLS handshake
+        individually. The timings are kept in ``setup``, in seconds.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, origin: Tuple[str, int, bool],
+                 setup: Dict[str, float] = None):
+        """Instantiates the members of the class.
+
+        Args:
+            reader: Stream to read the responses from.
+            writer: Stream to write the requests to.
+            origin: Host, port and scheme of the connection.
+            setup: Seconds spent on each phase of opening the connection.
+        """
+        self.reader = reader
+        self.writer = writer
+        self.origin = origin
+        self.setup = setup or {}
+        self.closed = False
+
+    @classmethod
+    async def open(cls, request: PreparedRequest) -> "Connection":
+        """Opens a connection to the host of the request.
+
+        Args:
+            request: Prepared request.
+
+        Returns:
+            Connection:
+            Connection that is ready to send requests.
+        """
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        family, kind, proto, _, address = (await loop.getaddrinfo(request.host, request.port,
+                                                                  type=socket.SOCK_STREAM))[0]
+        resolved = time.perf_counter()
+        sock = socket.socket(family, kind, proto)
+        sock.setblocking(False)
+        try:
+            await loop.sock_connect(sock, address)
+            connected = time.perf_counter()
+            reader, writer = await asyncio.open_connection(sock=sock, ssl=request.ssl,
+                                                           server_hostname=request.host if request.ssl else None)
+        except BaseException:
+            sock.close()
+            raise
+        setup = {'dns': resolved - start, 'connect': connected - resolved}
+        if request.ssl:
+            setup['tls'] = time.perf_counter() - connected
+        return cls(reader=reader, writer=writer, origin=request.origin, setup=setup)
+
+    def close(self) -> None:
+        """Closes the connection."""
+        self.closed = True
+        self.writer.close()
+
+    async def _read_headers(self) -> Tuple[str, int, str, Dict[str, str]]:
+        """Reads the status line and the headers of a response.
+
+        Returns:
+            Tuple[str, int, str, Dict[str, str]]:
+            HTTP version, status code, reason and the headers with lower case names.
+        """
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connection closed by the server")
+        version, status, *reason = status_line.decode('latin-1').rstrip('\r\n').split(' ', 2)
+        headers = {}
+        while (line := await self.reader.readline()) not in (b'\r\n', b'\n', b''):
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return version, int(status), reason[0] if reason else '', headers
+
+    async def _read_body(self, method: str, status: int, headers: Dict[str, str]) -> int:
+        """Reads and discards the body of a response.
+
+        Args:
+            method: HTTP method of the request.
+            status: Status code of the response.
+            headers: Headers of the response.
+
+        Returns:
+            int:
+            Number of bytes in the body.
+        """
+        if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+            return 0
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            size = 0
+            while True:
+                chunk = int((await self.reader.readline()).split(b';')[0], 16)
+                if not chunk:
+                    while await self.reader.readline() not in (b'\r\n', b'\n', b''):
+                        pass
+                    return size
+                await self.reader.readexactly(chunk + 2)
+                size += chunk
+        if (length := headers.get('content-length')) is not None:
+            length = remaining = int(length)
+            while remaining:
+                remaining -= len(await self.reader.readexactly(min(remaining, 65_536)))
+            return length
+        size = 0
+        while data := await self.reader.read(65_536):
+            size += len(data)
+        self.closed = True
+        return size
+
+    async def send(self, request: PreparedRequest) -> Response:
+        """Sends a request and reads the response.
+
+        Args:
+            request: Prepared request.
+
+        Returns:
+            Response:
+            Status code, reason, the size of the body, and the time to the first byte and the body.
+        """
+        start = time.perf_counter()
+        self.writer.write(request.payload)
+        await self.writer.drain()
+        version, status, reason, headers = await self._read_headers()
+        first_byte = time.perf_counter()
+        size = await self._read_body(method=request.method, status=status, headers=headers)
+        connection = headers.get('connection', '').lower()
+        if connection == 'close' or (version == 'HTTP/1.0' and connection != 'keep-alive'):
+            self.close()
+        return Response(status=status, reason=reason, size=size, ttfb=first_byte - start,
+                        body=time.perf_counter() - first_byte)
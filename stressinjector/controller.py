@@ -0,0 +1,114 @@
+import asyncio
+import logging
+from threading import Event, Thread
+from typing import Any, Dict, Generator, Optional
+
+from .models import LOGGER
+
+
+class Controller:
+    """Base for the stress controllers, to run them blocking, in the background or awaited from asyncio.
+
+    >>> Controller
+
+    Each controller owns its stop event and threads, so several independent instances can run concurrently.
+
+    Examples:
+        >>> with CPUStress(seconds=60, blocking=False) as stress:
+        ...     benchmark()  # runs while the CPU is stressed, stress is stopped when the block exits
+
+        >>> stress = MemoryStress(gigabytes=4, blocking=False).start()
+        >>> stress.stop()
+        >>> report = stress.wait()
+
+        >>> report = await URLStress(url='http://0.0.0.0:5002/', blocking=False)
+    """
+
+    def __init__(self, logger: logging.Logger = None):
+        """Instantiates the members of the class.
+
+        Args:
+            logger: Custom logger.
+        """
+        self.LOGGER = logger or LOGGER
+        self.report: Dict[str, Any] = {}
+        self.error: Optional[Exception] = None
+        self._stop_event = Event()
+        self._thread: Optional[Thread] = None
+
+    def _run(self) -> None:
+        """Runs the stress until completion, or until ``stop()`` is called. Implemented by each controller."""
+        raise NotImplementedError
+
+    def _execute(self) -> None:
+        """Target for the background thread, that logs and keeps the errors which would otherwise be lost."""
+        try:
+            self._run()
+        except Exception as error:
+            self.error = error
+            self.LOGGER.exception(error)
+
+    @property
+    def running(self) -> bool:
+        """Flag to indicate if the stress is running in the background."""
+        return bool(self._thread and self._thread.is_alive())
+
+    @property
+    def stopped(self) -> bool:
+        """Flag to indicate if a stop was requested."""
+        return self._stop_event.is_set()
+
+    def start(self) -> "Controller":
+        """Starts the stress in a background thread, and returns immediately.
+
+        Returns:
+            Controller:
+            The same controller object, to allow chaining.
+        """
+        if self._thread:
+            raise RuntimeError(f"{self.__class__.__name__} has already been started")
+        self._thread = Thread(target=self._execute, name=self.__class__.__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Requests the stress to stop. Use ``wait()`` to block until the teardown is complete."""
+        self._stop_event.set()
+
+    def wait(self, timeout: float = None) -> Optional[Dict[str, Any]]:
+        """Blocks until the stress running in the background has completed.
+
+        Args:
+            timeout: Maximum number of seconds to wait.
+
+        Returns:
+            dict:
+            Report of the run, or ``None`` if the stress is still running after the timeout.
+        """
+        if self._thread:
+            self._thread.join(timeout=timeout)
+        return None if self.running else self.report
+
+    def __enter__(self) -> "Controller":
+        """Starts the stress when entering the context."""
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        """Stops the stress and waits for the teardown when exiting the context."""
+        self.stop()
+        self.wait()
+
+    async def __aenter__(self) -> "Controller":
+        """Starts the stress when entering the asynchronous context."""
+        return self.start()
+
+    async def __aexit__(self, *args) -> None:
+        """Stops the stress and waits for the teardown without blocking the event loop."""
+        self.stop()
+        await asyncio.get_running_loop().run_in_executor(None, self.wait)
+
+    def __await__(self) -> Generator[Any, None, Optional[Dict[str, Any]]]:
+        """Starts the stress if required and waits for it to complete, without blocking the event loop."""
+        if not self._thread:
+            self.start()
+        return asyncio.get_running_loop().run_in_executor(None, self.wait).__await__()
@@ -1,17 +1,24 @@
 import logging
 import os
 import time
-from multiprocessing import Process
-from threading import Thread
-from typing import List
+from multiprocessing import Process, Value
+from multiprocessing.sharedctypes import Synchronized
+from threading import Event, Thread
+from typing import Dict, List, Union
 
 import psutil
 
+from .cgroup import LIMITS, limits
+from .controller import Controller
 from .helper import flush_screen, write_screen
-from .models import LOGGER
+from .kernels import KERNELS
+from .metrics import REGISTRY
+from .models import CPUKernel, UnsupportedOS, settings
+from .profiles import LoadProfile, Scheduler
+from .telemetry import CPUSampler
 
 
-class CPUStress:
+class CPUStress(Controller):
     """`Controller <https://git.io/J9cXV>`__ for CPU stress using multiprocessing. Gets duration as user input.
 
     >>> CPUStress
@@ -19,76 +26,289 @@ class CPUStress:
     CPU is stressed using `multiprocessing.Process <https://docs.python.org/3/library/multiprocessing.html#
     the-process-class>`__ to run the infinite loop on each process.
 
+    When a target ``percent`` below 100 is given, each process runs a busy/sleep duty cycle instead. The share of
+    every cycle spent busy is adjusted by a closed-loop controller from the live per-core readings, so the actual
+    utilization tracks the target.
+
+    The busy part of the loop runs a selectable workload ``kernel``, and each process reports the operations per second
+    it has achieved, so a run tells how much work was done and not just that the cores were busy.
+
+    A subset of ``cores`` can be stressed, either at the same ``percent`` or with a per-core load map. Each process is
+    then pinned to its core, and the report separates the stressed cores from the bystander cores, to measure the
+    interference across cores.
+
+    Runs to completion on instantiation by default. With ``blocking=False``, it can be started, stopped and awaited in
+    the background, using the API from :class:`~stressinjector.controller.Controller`.
+
+    A :class:`~stressinjector.profiles.LoadProfile` drives the target utilization of every stressed core over time,
+    instead of a flat ``percent`` held for the given ``seconds``.
+
+    Inside a container, the number of processes defaults to the CPU quota and the cpuset of its control group instead
+    of the cores of the host, and the effective limits are included in the report.
+
     Warnings:
         - CPU stress is induced in real time.
         - A relatively low performing machine may stall when stress is induced for a long duration.
 
     References:
         >>> CPUStress._infinite()
-            Triggers an infinite loop for the number of logical cores.
+            Triggers an infinite duty cycle loop for the number of logical cores.
+
+        >>> CPUStress._regulate()
+            Adjusts the duty cycle of each process towards the target utilization.
 
         >>> CPUStress._measure_cpu()
-            Measures the impact on each logical core in a dedicated thread.
+            Measures the impact on each logical core in a dedicated thread, by streaming samples from ``/proc/stat``.
     """
 
-    CORES = os.cpu_count()
+    CORES = LIMITS.cpus
+    PERIOD = 0.1  # length of one busy/sleep duty cycle in seconds
+    GAIN = 0.5  # integral gain of the controller, as duty fraction per unit of utilization error per second
 
-    def __init__(self, seconds: int = CORES * 5, logger: logging.Logger = None):
+    def __init__(self, seconds: int = CORES * 5, percent: Union[int, float] = 100,
+                 kernel: str = CPUKernel.spin, cores: Union[List[int], Dict[int, Union[int, float]]] = None,
+                 interval: float = 0.5, profile: LoadProfile = None, logger: logging.Logger = None,
+                 blocking: bool = True):
         """Instantiates the members of the class.
 
         Args:
             seconds: The number of seconds CPU has to be stressed. Defaults to five times the number of cores.
+            percent: Target utilization for each core. Defaults to 100.
+            kernel: Workload to run during the busy part of each cycle. Defaults to an empty range loop.
+            cores: Zero-based logical cores to stress and pin to, or a mapping of core to target utilization.
+                Defaults to as many cores as the CPU quota and the cpuset of the container allow, without pinning.
+            interval: Seconds between utilization samples. Defaults to 0.5
+            profile: Load profile in percent, that overrides the ``seconds`` and the target utilization of the cores.
             logger: Custom logger.
+            blocking: Runs the stress on instantiation when ``True``, otherwise waits for ``start()``.
         """
-        self.LOGGER = logger or LOGGER
+        super().__init__(logger=logger)
+        if cores is None:
+            self.targets = {core: percent for core in LIMITS.cores[:self.CORES]}
+        elif isinstance(cores, dict):
+            self.targets = dict(cores)
+        else:
+            self.targets = {core: percent for core in cores}
+        if profile:
+            seconds = profile.duration
+            self.targets = dict.fromkeys(self.targets, min(max(profile.level(0), 0.0), 100.0))
+        for target in self.targets.values():
+            if not 0 < target <= 100 and not profile:
+                raise ValueError(f"\n\nbad percent: {target}\n\nallowed: greater than 0 and up to 100")
+        self.pinned = cores is not None
+        if self.pinned:
+            self._validate_cores()
+        if kernel not in CPUKernel.__members__.keys():
+            raise ValueError(
+                f"\n\nbad kernel: {kernel}\n\nallowed: {', '.join(CPUKernel.__members__.keys())}"
+            )
         self.seconds = seconds
+        self.interval = interval
+        self.percent = percent
+        self.profile = profile
+        self.kernel = CPUKernel(kernel)
+        self.duty = [Value('d', target / 100, lock=False) for target in self.targets.values()]
+        self.ops = [Value('d', 0.0, lock=False) for _ in self.targets]
         self.start_time = None
-        self._run()
+        if blocking:
+            self._run()
+
+    def _validate_cores(self) -> None:
+        """Validates that the requested cores can be pinned to, on the current operating system.
+
+        Raises:
+            UnsupportedOS:
+            If the operating system does not support CPU affinity.
+            ValueError:
+            If any of the requested cores is not available to the current process.
+        """
+        if hasattr(os, 'sched_getaffinity'):
+            available = os.sched_getaffinity(0)
+        elif hasattr(psutil.Process, 'cpu_affinity'):
+            available = set(psutil.Process().cpu_affinity())
+        else:
+            raise UnsupportedOS(f"\n\nCPU affinity is not supported on {settings.os}\n")
+        if not self.targets or (invalid := set(self.targets) - available):
+            raise ValueError(
+                f"\n\nbad cores: {sorted(invalid) if self.targets else []}\n\nallowed: {sorted(available)}"
+            )
+
+    @staticmethod
+    def _pin(core: int) -> None:
+        """Pins the current process to a single logical core.
+
+        Args:
+            core: Zero-based logical core.
+        """
+        if hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, {core})
+        else:
+            psutil.Process().cpu_affinity([core])
 
-    def _infinite(self) -> None:
+    @staticmethod
+    def _infinite(duty: Synchronized, period: float, kernel: str, ops: Synchronized, core: int = None) -> None:
         """Infinite loop to stress each core on the CPU for the number of logical cores available.
 
+        Args:
+            duty: Shared fraction of each period that has to be spent busy.
+            period: Length of one busy/sleep cycle in seconds.
+            kernel: Name of the workload kernel to run while busy.
+            ops: Shared counter for the number of operations completed.
+            core: Logical core to pin the process to.
+
         See Also:
             The loop runs on each core as this function is triggered by ``processing.Process`` that runs as a loop.
         """
+        if core is not None:
+            CPUStress._pin(core)
+        batch = KERNELS[kernel].factory()
         while True:
             try:
-                for _ in range(self.CORES):
-                    pass
+                start = time.perf_counter()
+                busy_until = start + duty.value * period
+                done = 0
+                while time.perf_counter() < busy_until:
+                    done += batch()
+                ops.value += done
+                if (idle := start + period - time.perf_counter()) > 0:
+                    time.sleep(idle)
             except KeyboardInterrupt:
                 return
 
-    def _measure_cpu(self) -> None:
-        r"""Uses ``cpu_percent()`` to get the current CPU utilization and print the utilization percentage on each core.
+    def _regulate(self, cpu_util: Dict[int, float]) -> None:
+        """Adjusts the duty cycle of each process based on the deviation between the target and actual utilization.
+
+        Args:
+            cpu_util: Latest utilization percentage of each core.
 
-        Runs in a forever loop. Stops when the flag ``stop_thread`` is set to ``True``.
+        See Also:
+            - Pinned processes are regulated from the reading of their own core.
+            - Processes left to the scheduler are regulated from their share of the load across the cores in the cpuset,
+              since there can be fewer of them than cores under a CPU quota.
         """
-        # noinspection PyGlobalUndefined
-        global stop_thread
-        processors = []
-        while True:
-            cpu_util: List[float] = psutil.cpu_percent(interval=1, percpu=True)  # noqa
-            processors.append(cpu_util)  # stores the list of usage % as a list within a list
-            output = ''
-            for index, percent in enumerate(cpu_util):
-                output += f'Core {index + 1}: {percent}%\t'
-            write_screen(output.strip())
-            if stop_thread:
-                break
+        if not cpu_util:
+            return
+        usable = [cpu_util[core] for core in LIMITS.cores if core in cpu_util] or list(cpu_util.values())
+        share = min(sum(usable) / len(self.targets), 100.0)
+        gain = self.GAIN * self.interval
+        for (core, target), duty in zip(self.targets.items(), self.duty):
+            if target == 100:
+                continue
+            actual = cpu_util.get(core, share) if self.pinned else share
+            duty.value = min(max(duty.value + gain * (target - actual) / 100, 0.0), 1.0)
+
+    def _apply_level(self, level: float) -> None:
+        """Applies a new target utilization from the load profile to all the stressed cores.
+
+        Args:
+            level: Target utilization percentage.
+
+        See Also:
+            The duty cycle is shifted by the change in the target right away, and the controller corrects the rest.
+        """
+        level = min(max(level, 0.0), 100.0)
+        for (core, target), duty in zip(list(self.targets.items()), self.duty):
+            duty.value = 1.0 if level == 100 else min(max(duty.value + (level - target) / 100, 0.0), 1.0)
+            self.targets[core] = level
+        self._publish_targets()
+
+    def _publish_targets(self, active: bool = True) -> None:
+        """Publishes the target utilization of each stressed core to the metrics registry.
+
+        Args:
+            active: Publishes zero for each core when ``False``, once the stress has stopped.
+        """
+        for core, target in self.targets.items():
+            REGISTRY.gauge('stressinjector_cpu_target_percent', 'Target utilization of each stressed core',
+                           core=core).set(target if active else 0)
+
+    def _measure_cpu(self, done: Event) -> None:
+        """Streams the utilization of each core using ``CPUSampler`` and prints the utilization percentage of each.
+
+        Args:
+            done: Event that stops the measurement loop, once set.
+
+        See Also:
+            The summary only covers the stress, as the sampler is reset on the first sample after the processes start,
+            and the loop stops before they are terminated.
+        """
+        sampler = CPUSampler(interval=self.interval)
+        started = False
+
+        def on_sample(cpu_util: Dict[int, float]) -> None:
+            """Regulates the duty cycle and writes the latest sample to the screen."""
+            nonlocal started
+            if self.start_time and not started:
+                # the first sample straddles the start, so the summary starts from a full interval of stress
+                sampler.reset()
+                started = True
+            elif self.start_time:
+                self._regulate(cpu_util)
+            for core, percent in cpu_util.items():
+                REGISTRY.gauge('stressinjector_cpu_utilization_percent', 'Utilization of each logical core',
+                               core=core).set(percent)
+            write_screen('\t'.join(f'Core {core + 1}: {percent}%' for core, percent in cpu_util.items()))
+
+        sampler.run(done=done, callback=on_sample)
         flush_screen()
-        processors = map(list, zip(*processors))
-        processors = [max(processor) for processor in processors]
-        processors = list(enumerate(processors))
-        processors = sorted(processors, key=lambda x: x[1], reverse=True)
+        processors = sampler.summary()
+        for core, stats in processors.items():
+            # unpinned processes are not tied to the cores they are keyed by
+            stats['target'] = self.targets.get(core) if self.pinned else None
+        self.report['cores'] = processors
 
-        if self.start_time and (run_time := round(time.time() - self.start_time)):
+        if self.start_time and (run_time := round(self.report.get('run_time', time.time() - self.start_time))):
             if (stop_when := self.seconds - run_time) and stop_when > 0:
                 self.LOGGER.warning('Actual runtime: %d seconds. Stopped %d seconds early.', run_time, stop_when)
         else:
             self.LOGGER.warning('Stress Test was stopped before it began.')
 
-        self.LOGGER.info('CPU Usage Report:')
-        [print(f'Core {processor + 1} - {self._format_number(usage)}%') for processor, usage in processors]
+        processors = sorted(processors.items(), key=lambda x: x[1]['max'], reverse=True)
+        if not self.pinned:
+            self.LOGGER.info('CPU Usage Report:')
+            [print(self._format_usage(processor, stats)) for processor, stats in processors]
+            return
+        self.LOGGER.info('CPU Usage Report - Stressed cores:')
+        [print(self._format_usage(processor, stats)) for processor, stats in processors if processor in self.targets]
+        self.LOGGER.info('CPU Usage Report - Bystander cores:')
+        [print(self._format_usage(processor, stats)) for processor, stats in processors
+         if processor not in self.targets]
+
+    @classmethod
+    def _format_usage(cls, processor: int, stats: Dict[str, float]) -> str:
+        """Formats the usage summary of a core into a single line.
+
+        Args:
+            processor: Zero-based logical core.
+            stats: Summary of the core from ``CPUSampler``.
+
+        Returns:
+            str:
+            Usage summary of the core.
+        """
+        fields = [f'{key} {cls._format_number(stats[key])}%' for key in ('max', 'mean', 'p50', 'p95', 'min')]
+        line = ' - '.join([f'Core {processor + 1}'] + fields)
+        if stats['steal'] or stats['iowait']:
+            line += f" - steal {cls._format_number(stats['steal'])}% - iowait {cls._format_number(stats['iowait'])}%"
+        if stats.get('target') is not None:
+            line += f" - target {cls._format_number(float(stats['target']))}%"
+        return line
+
+    def _report_ops(self, run_time: float) -> None:
+        """Logs the operations per second achieved by each process, and the total across all of them.
+
+        Args:
+            run_time: Number of seconds the processes were running.
+        """
+        if not run_time:
+            return
+        unit = KERNELS[self.kernel].unit
+        rates = [ops.value / run_time for ops in self.ops]
+        self.report['ops_per_second'] = dict(zip(self.targets, rates))
+        self.LOGGER.info("Kernel '%s' throughput:", self.kernel.value)
+        for index, (core, rate) in enumerate(zip(self.targets, rates)):
+            print(f"{f'Core {core + 1}' if self.pinned else f'Process {index + 1}'} - {rate:,.0f} {unit}/s")
+        print(f'Total - {sum(rates):,.0f} {unit}/s')
 
     @classmethod
     def _format_number(cls, n: float) -> int:
@@ -110,25 +330,52 @@ class CPUStress:
             infinite: To kick off stress injector.
             measure: To measure the usage in the background running in a dedicated thread.
         """
-        # noinspection PyGlobalUndefined
-        global stop_thread
+        self.report = {'kernel': self.kernel.value, 'pinned': self.pinned, 'limits': limits().as_dict()}
+        if (quota := self.report['limits']['cpu_quota']) is not None:
+            self.LOGGER.info('CPU quota of the container is %s cores, across %d available cores', round(quota, 2),
+                             len(LIMITS.cores))
+        processes = []
+        done = Event()
+        measure = Thread(target=self._measure_cpu, args=(done,))
         try:
-            self.LOGGER.info('Stressing CPU cores for %d seconds', self.seconds)
-            processes = []
-            for n in range(self.CORES):
-                processes.append(Process(target=self._infinite))
-            stop_thread = False
-            measure = Thread(target=self._measure_cpu)
+            if self.profile:
+                self.LOGGER.info("Stressing CPU cores with '%s' profile for %d seconds with '%s' kernel",
+                                 self.profile.__class__.__name__, self.seconds, self.kernel.value)
+            elif self.pinned:
+                self.LOGGER.info("Stressing CPU cores %s for %d seconds with '%s' kernel",
+                                 ', '.join(f'{core + 1} at {self._format_number(float(target))}%'
+                                           for core, target in self.targets.items()),
+                                 self.seconds, self.kernel.value)
+            else:
+                self.LOGGER.info("Stressing CPU cores at %s%% for %d seconds with '%s' kernel",
+                                 self._format_number(float(self.percent)), self.seconds, self.kernel.value)
+            for core, duty, ops in zip(self.targets, self.duty, self.ops):
+                args = (duty, self.PERIOD, self.kernel.value, ops, core if self.pinned else None)
+                processes.append(Process(target=self._infinite, args=args, daemon=True))
             measure.start()
-            time.sleep(1)
+            if self._stop_event.wait(1):
+                return
             self.start_time = time.time()
             [each_core.start() for each_core in processes]
-            time.sleep(self.seconds)
+            self._publish_targets()
+            if self.profile:
+                scheduler = Scheduler(profile=self.profile, apply=self._apply_level)
+                scheduler.run(stop=self._stop_event)
+                self.report['profile'] = scheduler.report
+            else:
+                self._stop_event.wait(self.seconds)
+            self.report['run_time'] = time.time() - self.start_time
+            done.set()
+            measure.join()
             [each_core.terminate() for each_core in processes]
             [each_core.join() for each_core in processes]
-            time.sleep(1)
-            stop_thread = True
-            measure.join()
         except KeyboardInterrupt:
             self.LOGGER.warning('Manual interrupt received. Stopping stress.')
-            stop_thread = True
+        finally:
+            [each_core.terminate() for each_core in processes if each_core.is_alive()]
+            self._publish_targets(active=False)
+            done.set()
+            if measure.is_alive():
+                measure.join()
+        if self.report.get('run_time'):
+            self._report_ops(self.report['run_time'])
@@ -0,0 +1,481 @@
+import asyncio
+import logging
+import math
+import multiprocessing
+import random
+import time
+import urllib.parse
+from itertools import chain, repeat
+from threading import Event, Lock, Thread
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .client import Connection, PreparedRequest, prepare
+from .metrics import REGISTRY, Counter
+from .models import LOGGER, ArrivalType
+from .results import Histogram, Results
+from .scenario import RequestSpec, Scenario
+
+
+def _closed_arrivals(total: int, duration: float = None) -> Iterator[float]:
+    """Closed model, where each request is due as soon as a worker is free to send it.
+
+    Args:
+        total: Total number of requests.
+        duration: Seconds after which no more requests are due, even if the total was not reached.
+
+    Yields:
+        float:
+        Current time on the performance counter, for each request.
+    """
+    deadline = time.perf_counter() + duration if duration else math.inf
+    for _ in range(total):
+        if (now := time.perf_counter()) >= deadline:
+            return
+        yield now
+
+
+def _uniform_arrivals(rps: float, duration: float) -> Iterator[float]:
+    """Open model, where the requests are due at a constant interval.
+
+    Args:
+        rps: Requests per second.
+        duration: Seconds to schedule requests for.
+
+    Yields:
+        float:
+        Intended send time of each request on the performance counter.
+    """
+    start = time.perf_counter()
+    for index in range(math.ceil(rps * duration)):
+        yield start + index / rps
+
+
+def _poisson_arrivals(rps: float, duration: float) -> Iterator[float]:
+    """Open model, where the requests are due at exponentially distributed intervals, as independent users would be.
+
+    Args:
+        rps: Mean requests per second.
+        duration: Seconds to schedule requests for.
+
+    Yields:
+        float:
+        Intended send time of each request on the performance counter.
+    """
+    start = time.perf_counter()
+    elapsed = random.expovariate(rps)
+    while elapsed < duration:
+        yield start + elapsed
+        elapsed += random.expovariate(rps)
+
+
+_ARRIVALS = {
+    ArrivalType.uniform: _uniform_arrivals,
+    ArrivalType.poisson: _poisson_arrivals,
+}
+
+
+def publish(url: str, results: Results) -> None:
+    """Publishes the results of an engine that ran in another process to the metrics registry.
+
+    Args:
+        url: URL the requests were sent to.
+        results: Results of the engine.
+
+    See Also:
+        The latencies are published at the midpoint of their bucket in the results, which is within 1% of the value.
+    """
+    for status, count in results.status.items():
+        REGISTRY.counter('stressinjector_url_requests_total', 'Responses received by status code',
+                         url=url, status=status).inc(count)
+    for kind, count in results.exceptions.items():
+        REGISTRY.counter('stressinjector_url_errors_total', 'Requests that failed without a response',
+                         url=url, error=kind).inc(count)
+    REGISTRY.counter('stressinjector_url_received_bytes_total', 'Bytes received in the response bodies',
+                     url=url).inc(results.bytes)
+    latency = REGISTRY.histogram('stressinjector_url_latency_seconds', 'Latency of the responses', url=url)
+    for index, count in results.latency.counts.items():
+        latency.observe(Histogram.LOWEST * Histogram.GROWTH ** (index + 0.5), count)
+
+
+class Engine:
+    """Base for the load engines, that share a schedule of requests across a fixed number of workers.
+
+    >>> Engine
+
+    In the closed model, a fixed number of requests is sent as fast as the workers allow. In the open model, requests
+    are due on an arrival clock that is independent of the response times. A request that could not be sent on time,
+    because all the workers were busy, is sent as soon as a worker is free, and its latency is measured from the time it
+    was due. This corrects for coordinated omission, and the delay of each send is recorded as lag.
+
+    With a scenario, each worker pulls the next request from the scenario as it claims a slot in the schedule. The
+    scenario is only advanced as the workers become free, so at most ``concurrency`` requests are held in memory. With
+    several processes, the scenario is read once by the parent process, which feeds the requests to the engines in
+    batches through a bounded queue.
+    """
+
+    def __init__(self, method: str, url: str, total: int, concurrency: int, stop: Event,
+                 timeout: Union[int, float] = None, logger: logging.Logger = None, rps: float = None,
+                 duration: float = None, arrival: str = ArrivalType.uniform, scenario: Scenario = None,
+                 feed: multiprocessing.Queue = None, phases: bool = False, discard_body: bool = False,
+                 live_metrics: bool = True, **kwargs):
+        """Instantiates the members of the class.
+
+        Args:
+            method: HTTP method.
+            url: URL to send the requests to.
+            total: Total number of requests in the closed model.
+            concurrency: Number of workers.
+            stop: Event that stops the workers from claiming new requests, once set.
+            timeout: Timeout for each request.
+            logger: Custom logger.
+            rps: Requests per second in the open model.
+            duration: Seconds to schedule requests for, in the open model or in the closed model.
+            arrival: Arrival process in the open model.
+            scenario: Scenario to pull the requests from, instead of sending the same request each time.
+            feed: Queue of batches of requests from the parent process, that takes the place of the scenario, and ends
+                with ``None``.
+            phases: Records the time spent on each phase of the requests.
+            discard_body: Streams the response bodies and discards them without decoding.
+            live_metrics: Publishes each response to the metrics registry as it is received, otherwise collects them to
+                be taken with ``progress``.
+            kwargs: Keyword arguments to use in the request.
+        """
+        self.method = method
+        self.url = url
+        self.total = total
+        self.rps = rps
+        self.duration = duration
+        self.arrival = ArrivalType(arrival)
+        self.open = rps is not None
+        self.concurrency = max(concurrency if self.open else min(concurrency, total), 1)
+        self.stop = stop
+        self.timeout = timeout
+        self.kwargs = kwargs
+        self.scenario = scenario
+        self.feed = feed
+        self.phases = phases
+        self.discard_body = discard_body
+        self.default = RequestSpec(method=method, url=url, kwargs=kwargs)
+        self.LOGGER = logger or LOGGER
+        self._arrivals: Iterator[float] = iter(())
+        self._requests: Iterator[RequestSpec] = iter(())
+        self._lock = Lock()
+        self._errors_seen = set()
+        self.live_metrics = live_metrics
+        self._delta = Results()
+        self._delta_lock = Lock()
+        self._statuses: Dict[int, Counter] = {}
+        self._failures: Dict[str, Counter] = {}
+        self._latency = REGISTRY.histogram('stressinjector_url_latency_seconds', 'Latency of the responses', url=url)
+        self._received = REGISTRY.counter('stressinjector_url_received_bytes_total',
+                                          'Bytes received in the response bodies', url=url)
+
+    def _resolve(self, request: RequestSpec) -> RequestSpec:
+        """Resolves the URL of a request from the scenario against the URL of the engine.
+
+        Args:
+            request: Request from the scenario.
+
+        Returns:
+            RequestSpec:
+            Request with an absolute URL.
+        """
+        return request._replace(url=urllib.parse.urljoin(self.url, request.url))
+
+    def _schedule(self) -> None:
+        """Starts the arrival clock and the scenario, right before the workers start."""
+        if self.open:
+            self._arrivals = _ARRIVALS[self.arrival](rps=self.rps, duration=self.duration)
+        else:
+            self._arrivals = _closed_arrivals(total=self.total, duration=self.duration)
+        if self.feed is not None:
+            self._requests = map(self._resolve, chain.from_iterable(iter(self.feed.get, None)))
+        elif self.scenario is None:
+            self._requests = repeat(self.default)
+        else:
+            self._requests = map(self._resolve, iter(self.scenario))
+
+    def _claim(self) -> Optional[Tuple[float, RequestSpec]]:
+        """Claims the next request from the shared schedule.
+
+        Returns:
+            Tuple[float, RequestSpec]:
+            Time on the performance counter the request is due along with the request, or ``None`` if all the requests
+            are claimed or a stop was requested.
+        """
+        if self.stop.is_set():
+            return None
+        with self._lock:
+            if (due := next(self._arrivals, None)) is None or (request := next(self._requests, None)) is None:
+                return None
+            return due, request
+
+    def _log_error(self, error: Union[Exception, str]) -> None:
+        """Logs the first occurrence of each kind of error, to keep the logging off the hot path.
+
+        Args:
+            error: Exception or description of the failure.
+        """
+        kind = error.__class__.__name__ if isinstance(error, Exception) else error
+        if kind not in self._errors_seen:
+            self._errors_seen.add(kind)
+            self.LOGGER.error("request failed with '%s', further occurrences are only counted", str(error) or kind)
+
+    def _record(self, result: Results, latency: float, status: int, size: int) -> None:
+        """Records a response in the results of a worker, and publishes it to the metrics registry.
+
+        Args:
+            result: Results of the worker.
+            latency: Latency in seconds.
+            status: HTTP status code.
+            size: Size of the body in bytes.
+        """
+        result.record(latency=latency, status=status, size=size)
+        if not self.live_metrics:
+            with self._delta_lock:
+                self._delta.record(latency=latency, status=status, size=size)
+            return
+        if (counter := self._statuses.get(status)) is None:
+            counter = self._statuses[status] = REGISTRY.counter(
+                'stressinjector_url_requests_total', 'Responses received by status code', url=self.url, status=status
+            )
+        counter.inc()
+        self._latency.observe(latency)
+        self._received.inc(size)
+
+    def _fail(self, result: Results, error: Exception) -> None:
+        """Logs and records a request that failed without a response, and publishes it to the metrics registry.
+
+        Args:
+            result: Results of the worker.
+            error: Exception raised by the request.
+        """
+        self._log_error(error)
+        result.fail(error)
+        if not self.live_metrics:
+            with self._delta_lock:
+                self._delta.fail(error)
+            return
+        kind = error.__class__.__name__
+        if (counter := self._failures.get(kind)) is None:
+            counter = self._failures[kind] = REGISTRY.counter(
+                'stressinjector_url_errors_total', 'Requests that failed without a response', url=self.url, error=kind
+            )
+        counter.inc()
+
+    def progress(self) -> Results:
+        """Takes the responses collected since the previous call, when they are not published live.
+
+        Returns:
+            Results:
+            Responses and failures recorded since the previous call.
+
+        See Also:
+            Lets the parent process publish the responses of an engine that runs in another process, as they come in.
+        """
+        with self._delta_lock:
+            delta, self._delta = self._delta, Results()
+        return delta
+
+    def run(self) -> Results:
+        """Runs the workers until all the requests are sent, or a stop is requested. Implemented by each engine."""
+        raise NotImplementedError
+
+
+class ThreadEngine(Engine):
+    """Worker engine, that drives the requests from a fixed number of threads.
+
+    >>> ThreadEngine
+
+    Each thread owns a ``requests.Session`` with a single pooled keep-alive connection, and claims the next request
+    from a shared schedule. The concurrency is independent of the total number of requests, so neither the threads nor
+    the ephemeral ports are exhausted, and the TCP/TLS setup is paid once per worker instead of once per request.
+
+    See Also:
+        With ``discard_body`` or ``phases``, the bodies are streamed in chunks and discarded without being decoded or
+        decompressed. Phase timing is limited to the time to first byte, which includes the connection setup for a new
+        connection, and the body, since ``requests`` does not expose the DNS lookup, the connect and the TLS handshake.
+    """
+
+    def _worker(self, result: Results) -> None:
+        """Sends the requests claimed by this worker through its own session.
+
+        Args:
+            result: Results of this worker.
+        """
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1)
+        with requests.Session() as session:
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            while (claim := self._claim()) is not None:
+                due, request = claim
+                if (delay := due - time.perf_counter()) > 0 and self.stop.wait(delay):
+                    break
+                if self.open:
+                    result.lag.record(max(time.perf_counter() - due, 0.0))
+                stream = self.discard_body or self.phases
+                try:
+                    response = session.request(method=request.method, url=request.url, timeout=self.timeout,
+                                               stream=stream, **request.kwargs)
+                    if stream:
+                        first_byte = time.perf_counter()
+                        size = sum(len(chunk) for chunk in response.raw.stream(65_536, decode_content=False))
+                        response.close()
+                    else:
+                        size = len(response.content)
+                except Exception as error:
+                    self._fail(result, error)
+                    continue
+                if self.phases:
+                    result.record_phase('ttfb', response.elapsed.total_seconds())
+                    result.record_phase('body', time.perf_counter() - first_byte)
+                self._record(result, latency=time.perf_counter() - due, status=response.status_code, size=size)
+                if not response.ok:
+                    self._log_error(f'{response.status_code} {response.reason}')
+
+    def run(self) -> Results:
+        """Runs the workers until all the requests are sent, or a stop is requested.
+
+        Returns:
+            Results:
+            Results of all the workers merged together.
+        """
+        results: List[Results] = [Results() for _ in range(self.concurrency)]
+        self._schedule()
+        threads = [Thread(target=self._worker, args=(result,), daemon=True) for result in results]
+        [thread.start() for thread in threads]
+        [thread.join() for thread in threads]
+        merged = Results()
+        [merged.merge(result) for result in results]
+        return merged
+
+
+class AsyncEngine(Engine):
+    """Worker engine, that drives the requests from coroutines on a single event loop.
+
+    >>> AsyncEngine
+
+    Each coroutine holds one keep-alive HTTP/1.1 connection, so thousands of connections can be in flight from a single
+    thread without the overhead of the threads and the GIL. The request is serialized once and written as is on every
+    send, and the response bodies are discarded without being decoded. Requests from a scenario are serialized as they
+    are claimed, and the connection is reopened when a request is for a different host. With ``phases``, the DNS
+    lookup, the TCP connect and the TLS handshake are recorded for each new connection, along with the time to first
+    byte and the body for each response.
+
+    See Also:
+        Supports the ``params``, ``headers``, ``data``, ``json`` and ``verify`` keyword arguments of ``requests``.
+    """
+
+    # Seconds between the checks for a stop, while waiting for a request to be due.
+    POLL = 0.05
+
+    def __init__(self, *args, **kwargs):
+        """Instantiates the members of the class and prepares the request."""
+        super().__init__(*args, **kwargs)
+        self.request = prepare(self.method, self.url, **self.kwargs)
+
+    async def _connect(self, request: PreparedRequest, result: Results) -> Connection:
+        """Opens a new connection within the timeout, and records the time spent on each phase of the setup.
+
+        Args:
+            request: Request to open the connection for.
+            result: Results of the worker.
+
+        Returns:
+            Connection:
+            Connection to the host of the request.
+        """
+        connection = await asyncio.wait_for(Connection.open(request), timeout=self.timeout)
+        if self.phases:
+            for phase, seconds in connection.setup.items():
+                result.record_phase(phase, seconds)
+        return connection
+
+    async def _wait(self, due: float) -> bool:
+        """Sleeps until a request is due, checking for a stop on every ``POLL`` seconds.
+
+        Args:
+            due: Time on the performance counter the request is due.
+
+        Returns:
+            bool:
+            ``False`` if a stop was requested before the request was due, in which case it is dropped.
+        """
+        while (delay := due - time.perf_counter()) > 0:
+            if self.stop.is_set():
+                return False
+            await asyncio.sleep(min(delay, self.POLL))
+        return not self.stop.is_set()
+
+    async def _worker(self, result: Results) -> None:
+        """Sends the requests claimed by this worker through its own connection.
+
+        Args:
+            result: Results of this worker.
+
+        See Also:
+            Like ``requests``, the timeout applies to the connection and to the response separately. A reused connection
+            that was closed by the server is replaced once, without counting an error.
+        """
+        connection = None
+        while (claim := self._claim()) is not None:
+            due, spec = claim
+            if not await self._wait(due):
+                break
+            if self.open:
+                result.lag.record(max(time.perf_counter() - due, 0.0))
+            try:
+                request = self.request if spec is self.default else prepare(spec.method, spec.url, **spec.kwargs)
+                if connection is not None and connection.origin != request.origin:
+                    connection.close()
+                reused = connection is not None and not connection.closed
+                if not reused:
+                    connection = await self._connect(request, result)
+                try:
+                    response = await asyncio.wait_for(connection.send(request), timeout=self.timeout)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    if not reused:
+                        raise
+                    connection.close()
+                    connection = await self._connect(request, result)
+                    response = await asyncio.wait_for(connection.send(request), timeout=self.timeout)
+            except Exception as error:
+                if connection:
+                    connection.close()
+                    connection = None
+                self._fail(result, error)
+                continue
+            if self.phases:
+                result.record_phase('ttfb', response.ttfb)
+                result.record_phase('body', response.body)
+            self._record(result, latency=time.perf_counter() - due, status=response.status, size=response.size)
+            if response.status >= 400:
+                self._log_error(f'{response.status} {response.reason}')
+        if connection and not connection.closed:
+            connection.close()
+
+    async def _main(self) -> List[Results]:
+        """Runs all the workers on the event loop.
+
+        Returns:
+            List[Results]:
+            Results of each worker.
+        """
+        results = [Results() for _ in range(self.concurrency)]
+        self._schedule()
+        await asyncio.gather(*(self._worker(result) for result in results))
+        return results
+
+    def run(self) -> Results:
+        """Runs the workers on a new event loop until all the requests are sent, or a stop is requested.
+
+        Returns:
+            Results:
+            Results of all the workers merged together.
+        """
+        merged = Results()
+        [merged.merge(result) for result in asyncio.run(self._main())]
+        return merged
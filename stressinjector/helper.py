@@ -1,6 +1,7 @@
+import math
 import os
 import sys
-from typing import Any
+from typing import Any, Union
 
 from .models import settings
 
@@ -24,3 +25,21 @@ def write_screen(text: Any) -> None:
         text: Text to be written.
     """
     sys.stdout.write(f"\r{text}")
+
+
+def size_converter(byte_size: Union[int, float]) -> str:
+    """Gets the current memory consumed and converts it to human friendly format.
+
+    Args:
+        byte_size: Receives byte size as argument.
+
+    Returns:
+        str:
+        Converted human understandable size.
+    """
+    if not byte_size:
+        return '0 B'
+    size_name = ("B", "KB", "MB", "GB", "TB", "PB", "EB", "ZB", "YB")
+    integer = int(math.floor(math.log(byte_size, 1024)))
+    size = round(byte_size / pow(1024, integer), 2)
+    return str(size) + ' ' + size_name[integer]
@@ -0,0 +1,199 @@
+import hashlib
+import zlib
+from typing import Callable, Dict, NamedTuple
+
+import numpy
+from threadpoolctl import threadpool_limits
+
+Batch = Callable[[], int]
+
+
+class Kernel(NamedTuple):
+    """Wrapper for a workload kernel, that holds the factory and the unit of the operations it reports."""
+
+    factory: Callable[[], Batch]
+    unit: str
+
+
+def _spin() -> Batch:
+    """Empty range loop, that mostly exercises the interpreter's dispatch loop.
+
+    Returns:
+        Batch:
+        Callable that runs one batch of loop iterations.
+    """
+
+    def batch() -> int:
+        """Runs one batch of empty loop iterations."""
+        for _ in range(1_000):
+            pass
+        return 1_000
+
+    return batch
+
+
+def _integer() -> Batch:
+    """Integer ALU workload using a linear congruential generator.
+
+    Returns:
+        Batch:
+        Callable that runs one batch of multiply, add and mask operations.
+    """
+    state = 1
+
+    def batch() -> int:
+        """Runs one batch of integer operations."""
+        nonlocal state
+        x = state
+        for _ in range(1_000):
+            x = (x * 1103515245 + 12345) & 0x7FFFFFFF
+        state = x
+        return 3_000
+
+    return batch
+
+
+def _matmul(size: int = 128) -> Batch:
+    """Vectorized floating point workload using NumPy matrix multiplication.
+
+    Args:
+        size: Number of rows and columns in the square matrices.
+
+    Returns:
+        Batch:
+        Callable that runs one matrix multiplication.
+
+    See Also:
+        BLAS libraries run a multiplication of this size on their own thread pool, which would spread each process
+        across several cores. The factory runs within the worker process, and limits BLAS to a single thread there, so
+        that each process keeps to its core and the duty cycle and the operations per second stay per core.
+    """
+    threadpool_limits(limits=1, user_api='blas')
+    rng = numpy.random.default_rng()
+    a, b = rng.random((size, size)), rng.random((size, size))
+    out = numpy.empty((size, size))
+    flops = 2 * size ** 3
+
+    def batch() -> int:
+        """Runs one matrix multiplication and returns the floating point operations."""
+        numpy.matmul(a, b, out=out)
+        return flops
+
+    return batch
+
+
+def pointer_chase(working_set: int, lanes: int = 512, steps: int = 16) -> Batch:
+    """Cache thrashing workload, that chases pointers through a random cycle sized to a level of the cache.
+
+    Args:
+        working_set: Size of the pointer array in bytes.
+        lanes: Number of independent chases advanced together in every step.
+        steps: Number of dependent steps in every batch.
+
+    Returns:
+        Batch:
+        Callable that runs one batch of dependent loads.
+
+    See Also:
+        - The cycle links each entry to the next one in a random permutation, and the last one back to the first, so it
+          visits every entry once and the hardware prefetcher cannot predict the next address.
+        - Each step depends on the result of the previous one, and the lanes only keep the NumPy overhead amortized.
+        - The lanes and the result of each step take 8 KiB between them, which leaves room for a 16 KiB working set in
+          a 32 KiB L1 data cache.
+        - The per-element cost of ``take`` hides much of the latency of an L2 hit, so the gap between the L1 and the L2
+          working sets is narrower than the gap to the last level cache.
+    """
+    entries = working_set // 8
+    rng = numpy.random.default_rng()
+    order = rng.permutation(entries)
+    chain = numpy.empty(entries, dtype=numpy.int64)
+    chain[order] = numpy.roll(order, -1)
+    index = rng.integers(0, entries, size=min(lanes, entries))
+    accesses = index.size * steps
+
+    def batch() -> int:
+        """Runs one batch of pointer chasing and returns the number of loads."""
+        nonlocal index
+        for _ in range(steps):
+            index = chain.take(index)
+        return accesses
+
+    return batch
+
+
+def _branch(size: int = 4_096) -> Batch:
+    """Branch heavy workload, that takes a random direction on every iteration to defeat the branch predictor.
+
+    Args:
+        size: Number of pre-generated random directions.
+
+    Returns:
+        Batch:
+        Callable that runs one batch of unpredictable branches.
+    """
+    directions = numpy.random.default_rng().integers(0, 2, size=size).astype(bool).tolist()
+
+    def batch() -> int:
+        """Runs one batch of branches."""
+        total = 0
+        for taken in directions:
+            if taken:
+                total += 1
+            else:
+                total -= 1
+        return size
+
+    return batch
+
+
+def _hash(size: int = 65_536) -> Batch:
+    """Hashing workload using SHA-256.
+
+    Args:
+        size: Number of bytes hashed in every batch.
+
+    Returns:
+        Batch:
+        Callable that hashes one buffer.
+    """
+    buffer = numpy.random.bytes(size)
+
+    def batch() -> int:
+        """Hashes the buffer and returns the number of bytes processed."""
+        hashlib.sha256(buffer).digest()
+        return size
+
+    return batch
+
+
+def _compress(size: int = 65_536) -> Batch:
+    """Compression workload using zlib on partly redundant data.
+
+    Args:
+        size: Number of bytes compressed in every batch.
+
+    Returns:
+        Batch:
+        Callable that compresses one buffer.
+    """
+    buffer = (numpy.random.bytes(size // 16) * 16)[:size]
+
+    def batch() -> int:
+        """Compresses the buffer and returns the number of bytes processed."""
+        zlib.compress(buffer, 6)
+        return size
+
+    return batch
+
+
+KERNELS: Dict[str, Kernel] = {
+    "spin": Kernel(factory=_spin, unit="iterations"),
+    "integer": Kernel(factory=_integer, unit="int ops"),
+    "matmul": Kernel(factory=_matmul, unit="FLOP"),
+    "cache_l1": Kernel(factory=lambda: pointer_chase(working_set=16 * 1024), unit="loads"),
+    "cache_l2": Kernel(factory=lambda: pointer_chase(working_set=1024 * 1024), unit="loads"),
+    "cache_llc": Kernel(factory=lambda: pointer_chase(working_set=64 * 1024 * 1024), unit="loads"),
+    "branch": Kernel(factory=_branch, unit="branches"),
+    "hash": Kernel(factory=_hash, unit="bytes"),
+    "compress": Kernel(factory=_compress, unit="bytes"),
+}
@@ -1,46 +1,133 @@
 import logging
 import math
+import mmap
 import time
-from typing import Union
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Thread
+from typing import Dict, List, Tuple, Union
 
+import numpy
 import psutil
-from numpy.random import bytes
 from tqdm import tqdm
 
-from .helper import flush_screen
-from .models import LOGGER, operating_system, settings
+from .cgroup import LIMITS, limits, memory_usage
+from .controller import Controller
+from .helper import flush_screen, size_converter, write_screen
+from .metrics import REGISTRY
+from .models import FillStrategy, operating_system, settings
+from .profiles import LoadProfile, Scheduler
+from .telemetry import MemorySampler
 
 if settings.os != operating_system.windows:
     import resource
 
+Segment = Union[bytes, numpy.ndarray, mmap.mmap]
 
-def _size_converter(byte_size: Union[int, float]) -> str:
-    """Gets the current memory consumed and converts it to human friendly format.
+# Fields of the memory accounting that are published as gauges, along with their description.
+_PUBLISHED = {'held': 'Memory held by the stress', 'rss': 'Resident set size of the process',
+              'uss': 'Unique set size of the process', 'swap': 'Swap used by the process',
+              'available': 'Memory available on the system'}
+
+
+def _fill_random(size: int, **_) -> Segment:
+    """Generates `random bytes <https://numpy.org/doc/stable/reference/random/generated/numpy.random.bytes.html>`__.
+
+    Args:
+        size: Number of bytes to generate.
+
+    Returns:
+        bytes:
+        Random bytes from the legacy global generator.
+    """
+    return numpy.random.bytes(size)
+
+
+def _fill_generator(size: int, **_) -> Segment:
+    """Fills a preallocated array in bulk with a NumPy `Generator <https://numpy.org/doc/stable/reference/random/>`__.
+
+    The generator releases the GIL while filling, so the workers fill the segments in parallel.
 
     Args:
-        byte_size: Receives byte size as argument.
+        size: Number of bytes to allocate, in multiples of 8.
 
     Returns:
-        str:
-        Converted human understandable size.
+        numpy.ndarray:
+        Array of random bytes.
     """
-    size_name = ("B", "KB", "MB", "GB", "TB", "PB", "EB", "ZB", "YB")
-    integer = int(math.floor(math.log(byte_size, 1024)))
-    size = round(byte_size / pow(1024, integer), 2)
-    return str(size) + ' ' + size_name[integer]
+    array = numpy.empty(size, dtype=numpy.uint8)
+    numpy.random.default_rng().random(out=array.view(numpy.float64))
+    return array
 
 
-class MemoryStress:
+def _fill_zeros(size: int, **_) -> Segment:
+    """Allocates a zero-filled array, and writes to every page as the first touch to make it resident.
+
+    Args:
+        size: Number of bytes to allocate.
+
+    Returns:
+        numpy.ndarray:
+        Array of zeros.
+    """
+    array = numpy.zeros(size, dtype=numpy.uint8)
+    array[::mmap.PAGESIZE] = 0
+    return array
+
+
+def _fill_mmap(size: int, hugepages: bool = False) -> Segment:
+    """Maps anonymous memory, and touches every page to make it resident.
+
+    Args:
+        size: Number of bytes to map.
+        hugepages: Advises the kernel to back the mapping with transparent huge pages.
+
+    Returns:
+        mmap.mmap:
+        Anonymous memory map.
+    """
+    if hasattr(mmap, 'MAP_ANONYMOUS'):
+        segment = mmap.mmap(-1, size, flags=mmap.MAP_PRIVATE | mmap.MAP_ANONYMOUS)
+    else:
+        segment = mmap.mmap(-1, size)
+    if hugepages:
+        segment.madvise(mmap.MADV_HUGEPAGE)
+    numpy.frombuffer(segment, dtype=numpy.uint8)[::mmap.PAGESIZE] = 1
+    return segment
+
+
+_FILLS = {
+    FillStrategy.random: _fill_random,
+    FillStrategy.generator: _fill_generator,
+    FillStrategy.zeros: _fill_zeros,
+    FillStrategy.mmap: _fill_mmap,
+}
+
+
+class MemoryStress(Controller):
     """`Controller <https://git.io/J9cXr>`__ to trigger the memory stress. Gets number of GBs as user input.
 
     >>> MemoryStress
 
-    Args:
-        gigabytes:
-            - The number of gigabytes for which the memory has to be stressed. Defaults to twice the number of GBs.
+    Memory is allocated in segments using the fill ``strategy`` of choice, by a pool of ``workers`` threads in
+    parallel, and the fill rate is reported in GB/s. By default, ``gigabytes`` is twice the physical memory of the host,
+    or ``SAFETY`` of the memory limit inside a container.
+
+    A :class:`~stressinjector.profiles.LoadProfile` in gigabytes drives the memory held over time, instead of a flat
+    ``gigabytes`` value. Memory is grown and shrunk one segment at a time to follow the profile.
+
+    A ``target`` in bytes, percent of total or percent of available memory can be held for ``hold`` seconds instead. A
+    feedback loop grows or shrinks the allocation to keep the resident set at the target, as other processes come and
+    go, and the memory is released at the ``release_rate`` in the end, to observe reclaim under controlled pressure.
+
+    RSS, USS, PSS, swap, page faults and the available memory are sampled live during the run, and returned in the
+    report as a summary and a time series, to correlate the allocation rate with reclaim and swapping.
 
-    See Also:
-        Suggests twice the amount of physical memory.
+    Runs to completion on instantiation by default. With ``blocking=False``, it can be started, stopped and awaited in
+    the background, using the API from :class:`~stressinjector.controller.Controller`.
+
+    Inside a container with a memory limit, every allocation is capped at ``SAFETY`` of the limit including the memory
+    already used by the process, since going beyond the limit gets the container killed instead of stressed.
+    Percentages of the ``total`` and ``available`` memory are also relative to the limit.
 
     Warnings:
         - Memory stress is induced in real time.
@@ -49,42 +136,294 @@ class MemoryStress:
     References:
         >>> MemoryStress._stress()
 
-            Generates ``random bytes``, 1024 times the ``GigaBytes`` value entered during prompt or class intialization.
+            Allocates segments of memory, for the ``GigaBytes`` value entered during prompt or class initialization.
 
-        >>> _size_converter()
+        >>> helper.size_converter()
 
             Converts ``bytes`` to human-readable size format.
     """
 
-    MAX_DEFAULT = round(float(_size_converter(psutil.virtual_memory().total).split()[0]) * 2)
+    SAFETY = 0.9  # share of the memory limit of the container that can be held
+    MAX_DEFAULT = round(LIMITS.memory * SAFETY / 1024 ** 3, 2) if LIMITS.memory else \
+        round(float(size_converter(psutil.virtual_memory().total).split()[0]) * 2)
+    SEGMENT = 64 * 1024 * 1024  # bytes allocated by each fill call
 
-    def __init__(self, gigabytes: int = MAX_DEFAULT, logger: logging.Logger = None):
+    def __init__(self, gigabytes: int = MAX_DEFAULT, profile: LoadProfile = None,
+                 strategy: str = FillStrategy.generator, workers: int = LIMITS.cpus, hugepages: bool = False,
+                 target: Union[int, str] = None, hold: float = 0, release_rate: float = None, interval: float = 0.5,
+                 logger: logging.Logger = None, blocking: bool = True):
         """Instantiates the members of the class.
 
         Args:
-            gigabytes: The number of gigabytes, memory has to be stressed. Defaults to twice the physical memory.
+            gigabytes: The number of gigabytes, memory has to be stressed. Defaults to twice the physical memory, or
+                ``SAFETY`` of the memory limit inside a container.
+            profile: Load profile in gigabytes, that overrides the ``gigabytes`` value.
+            strategy: Fill strategy to allocate and touch the memory. Defaults to bulk ``numpy.random.Generator`` fills.
+            workers: Number of threads that fill the segments in parallel. Defaults to the number of cores.
+            hugepages: Advises transparent huge pages for the ``mmap`` strategy.
+            target: Resident set size to hold, as bytes, or a string like ``75%`` for a percentage of the total memory
+                or ``75% available`` for a percentage of the available memory. Defaults to the ``gigabytes`` value.
+            hold: Number of seconds to hold the target, once it is reached.
+            release_rate: Bytes per second to release the memory at, in the end. Defaults to releasing all at once.
+            interval: Seconds between two memory samples, and between two corrections of the feedback loop while
+                holding. Defaults to 0.5
             logger: Custom logger.
+            blocking: Runs the stress on instantiation when ``True``, otherwise waits for ``start()``.
         """
-        self.LOGGER = logger or LOGGER
+        if strategy not in FillStrategy.__members__.keys():
+            raise ValueError(
+                f"\n\nbad strategy: {strategy}\n\nallowed: {', '.join(FillStrategy.__members__.keys())}"
+            )
+        if hugepages and (strategy != FillStrategy.mmap or not hasattr(mmap, 'MADV_HUGEPAGE')):
+            raise ValueError("\n\nhugepages are supported only with the 'mmap' strategy on Linux\n")
+        if target is not None:
+            self._parse_target(target)
+        super().__init__(logger=logger)
         self.gigabytes = gigabytes
-        self._run()
+        self.profile = profile
+        self.strategy = FillStrategy(strategy)
+        self.workers = max(int(workers), 1)
+        self.hugepages = hugepages
+        self.target = target
+        self.hold = hold
+        self.release_rate = release_rate
+        self.interval = interval
+        self._process = psutil.Process()
+        self._segments: List[Segment] = []
+        self._target = 0
+        self.limits = limits()
+        self.cap = int(self.limits.memory * self.SAFETY) if self.limits.memory else None
+        self._baseline = self._process.memory_info().rss
+        self._capped = False
+        if blocking:
+            self._run()
+
+    def _grow(self, size: int, progress: tqdm = None) -> int:
+        """Allocates segments of memory in parallel, until the size is reached or a stop is requested.
 
-    @classmethod
-    def _stress(cls, mb: int) -> str:
-        """Generates `random bytes <https://numpy.org/doc/stable/reference/random/generated/numpy.random.bytes.html>`__.
+        Args:
+            size: Number of bytes to allocate, rounded up to a multiple of the segment size.
+            progress: Progress bar to update with the bytes allocated.
+
+        Returns:
+            int:
+            Number of bytes allocated.
+        """
+        fill = _FILLS[self.strategy]
+        count = math.ceil(size / self.SEGMENT)
+        allocated = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for start in range(0, count, self.workers):
+                if self._stop_event.is_set():
+                    break
+                batch = min(self.workers, count - start)
+                for segment in executor.map(lambda _: fill(self.SEGMENT, hugepages=self.hugepages), range(batch)):
+                    self._segments.append(segment)
+                    allocated += self.SEGMENT
+                    if progress is not None:
+                        progress.update(self.SEGMENT)
+        return allocated
+
+    def _shrink(self, size: int) -> None:
+        """Releases segments of memory.
+
+        Args:
+            size: Number of bytes to release, rounded down to a multiple of the segment size.
+        """
+        for _ in range(min(size // self.SEGMENT, len(self._segments))):
+            segment = self._segments.pop()
+            if isinstance(segment, mmap.mmap):
+                segment.close()
 
-        Bytes are generated with the multiple of 1024 ~ 1GB. Uses tqdm module to show a progress bar.
+    def _cap(self, size: int, resident: bool = False) -> int:
+        """Caps a size to the memory limit of the container, and warns the first time it is capped.
 
         Args:
-            mb: The number of ``MegaBytes`` of stress has be induced A.k.a. random bytes have to be generated.
+            size: Number of bytes.
+            resident: Flag to indicate that the size includes the memory already used by the process.
+
+        Returns:
+            int:
+            Number of bytes within the cap.
+        """
+        if self.cap is None:
+            return size
+        cap = max(self.cap if resident else self.cap - self._baseline, 0)
+        cap -= cap % self.SEGMENT
+        if size <= cap:
+            return size
+        if not self._capped:
+            self._capped = True
+            self.LOGGER.warning('Capping %s to %s, which is %d%% of the memory limit of the container',
+                                size_converter(size), size_converter(cap), self.SAFETY * 100)
+        return cap
+
+    @property
+    def held(self) -> int:
+        """Number of bytes currently held by the stress."""
+        return len(self._segments) * self.SEGMENT
+
+    def _stress(self, size: int) -> str:
+        """Allocates the memory using the fill strategy and measures the fill rate.
+
+        Uses tqdm module to show a progress bar.
+
+        Args:
+            size: The number of bytes of stress that has to be induced.
 
         Returns:
             str:
             Calls the ``size_converter`` method to get the human-readable size of stress that was induced.
         """
-        mb2bytes = 1024 * 1024
-        result = [bytes(mb2bytes) for _ in tqdm(range(mb), desc='Generating random bytes', unit=' bytes', leave=False)]
-        return f'Stress Injected: {_size_converter(len(result) * mb2bytes)}'
+        start = time.perf_counter()
+        with tqdm(total=size, desc=f'Filling memory ({self.strategy.value})', unit='B', unit_scale=True,
+                  unit_divisor=1024, leave=False) as progress:
+            self.report['stressed'] = self._grow(size=size, progress=progress)
+        elapsed = time.perf_counter() - start
+        self.report['fill_rate'] = round(self.report['stressed'] / elapsed / 1024 ** 3, 3) if elapsed else 0
+        return (f'Stress Injected: {size_converter(self.report["stressed"])} '
+                f'at {self.report["fill_rate"]} GB/s using {self.workers} workers')
+
+    def _apply_level(self, level: float) -> None:
+        """Applies a new target from the load profile, that is picked up by ``_follow``.
+
+        Args:
+            level: Number of gigabytes to hold.
+        """
+        self._target = self._cap(max(int(level * 1024 ** 3), 0))
+
+    def _follow(self) -> str:
+        """Grows or shrinks the memory held towards the level of the load profile, until the profile completes.
+
+        Returns:
+            str:
+            Human-readable size of the peak stress that was induced.
+        """
+        scheduler = Scheduler(profile=self.profile, apply=self._apply_level)
+        thread = Thread(target=scheduler.run, args=(self._stop_event,), daemon=True)
+        thread.start()
+        peak = 0
+        while thread.is_alive():
+            target = round(self._target / self.SEGMENT) * self.SEGMENT
+            if (diff := target - self.held) > 0:
+                self._grow(min(diff, self.workers * self.SEGMENT))
+            elif diff < 0:
+                self._shrink(-diff)
+            else:
+                self._stop_event.wait(scheduler.resolution / 2)
+                continue
+            peak = max(peak, self.held)
+            write_screen(f'Holding {size_converter(self.held)} - target {size_converter(target)}')
+        thread.join()
+        flush_screen()
+        self.report['profile'] = scheduler.report
+        self.report['stressed'] = peak
+        return f'Peak Stress Injected: {size_converter(self.report["stressed"])}'
+
+    @staticmethod
+    def _parse_target(target: Union[int, str]) -> Tuple[float, str]:
+        """Parses the target into a value and its kind.
+
+        Args:
+            target: Bytes, or a percentage of the ``total`` or ``available`` memory.
+
+        Returns:
+            Tuple[float, str]:
+            Number of bytes or the percentage, along with ``bytes``, ``total`` or ``available``.
+        """
+        if not isinstance(target, str):
+            return float(target), 'bytes'
+        percent, _, kind = target.partition('%')
+        kind = kind.strip() or 'total'
+        try:
+            percent = float(percent)
+        except ValueError:
+            percent = None
+        if percent is None or not 0 < percent <= 100 or kind not in ('total', 'available'):
+            raise ValueError(f"\n\nbad target: {target}\n\nallowed: bytes, '<percent>%' or '<percent>% available'")
+        return percent, kind
+
+    def _resolve(self) -> int:
+        """Resolves the target into the number of bytes that have to be resident, from the current memory state.
+
+        Returns:
+            int:
+            Resident set size to hold.
+
+        See Also:
+            A percentage of the available memory includes the memory already held, so the target shrinks when other
+            processes allocate, and grows when they release.
+        """
+        if self.target is None:
+            return self._cap(int(self.gigabytes * 1024 ** 3), resident=True)
+        value, kind = self._parse_target(self.target)
+        if kind == 'bytes':
+            return self._cap(int(value), resident=True)
+        memory = psutil.virtual_memory()
+        total, available = memory.total, memory.available
+        if self.limits.memory:
+            total = self.limits.memory
+            if (usage := memory_usage()) is not None:
+                available = min(available, max(total - usage, 0))
+        if kind == 'total':
+            return self._cap(int(total * value / 100), resident=True)
+        return self._cap(int((available + self._process.memory_info().rss) * value / 100), resident=True)
+
+    def _hold(self) -> str:
+        """Grows to the target and holds it for the duration, correcting the allocation in a feedback loop.
+
+        Returns:
+            str:
+            Human-readable size of the peak stress that was induced.
+        """
+        peak, deadline, corrections = 0, None, 0
+        while not self._stop_event.is_set():
+            desired = self._resolve()
+            error = desired - self._process.memory_info().rss
+            held = self.held
+            if error >= self.SEGMENT:
+                # the mmap strategy fails with an OSError (ENOMEM) rather than a MemoryError
+                try:
+                    self._grow(min(error, self.workers * self.SEGMENT))
+                except (MemoryError, OSError) as warning:
+                    self.LOGGER.warning('Unable to grow towards the target: %s', warning)
+            elif error <= -self.SEGMENT and self._segments:
+                self._shrink(-error)
+            elif deadline is None:
+                if error <= -self.SEGMENT:
+                    self.LOGGER.warning('Target of %s is below the memory used by the process without any stress',
+                                        size_converter(desired))
+                self.LOGGER.info('Target of %s reached, holding for %d seconds', size_converter(desired), self.hold)
+                deadline = time.monotonic() + self.hold
+            if deadline is not None and self.held != held:
+                corrections += 1
+            peak = max(peak, self.held)
+            write_screen(f'Holding {size_converter(self.held)} - target {size_converter(desired)}')
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            # waits once on target, and after a correction that changed nothing, such as a failed allocation
+            if self.held == held:
+                self._stop_event.wait(self.interval)
+        flush_screen()
+        self.report['target'] = self._resolve()
+        self.report['corrections'] = corrections
+        self.report['stressed'] = peak
+        return f'Peak Stress Injected: {size_converter(self.report["stressed"])}'
+
+    def _release(self) -> None:
+        """Releases the memory held, one segment at a time at the release rate, or all at once after a stop."""
+        if self.release_rate and self._segments and not self._stop_event.is_set():
+            self.LOGGER.info('Releasing %s at %s/s', size_converter(self.held), size_converter(self.release_rate))
+            pause = self.SEGMENT / self.release_rate
+            deadline = time.monotonic()
+            while self._segments:
+                self._shrink(self.SEGMENT)
+                write_screen(f'Releasing - holding {size_converter(self.held)}')
+                deadline += pause
+                if self._stop_event.wait(max(deadline - time.monotonic(), 0)):
+                    break
+            flush_screen()
+        self._shrink(self.held)
 
     @classmethod
     def _memory_util_check(cls) -> Union[int, float]:
@@ -110,10 +449,37 @@ class MemoryStress:
         if settings.os == operating_system.macOS:
             return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
         if settings.os == operating_system.linux:
-            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1e+3
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
         if settings.os == operating_system.windows:
             return psutil.Process(settings.pid).memory_info().peak_wset
 
+    def _log_accounting(self, summary: Dict[str, Union[int, float]]) -> None:
+        """Logs the summary of the live memory accounting.
+
+        Args:
+            summary: Summary from ``MemorySampler``.
+        """
+        if not summary:
+            return
+        self.LOGGER.info('Memory Accounting Report:')
+        for key, label in (('peak_rss', 'Peak RSS'), ('peak_uss', 'Peak USS'), ('peak_pss', 'Peak PSS'),
+                           ('peak_swap', 'Peak swap'), ('min_available', 'Lowest available memory'),
+                           ('peak_system_swap', 'Peak system swap')):
+            print(f'{label} - {size_converter(summary[key])}')
+        print(f"Page faults - {summary['minor_faults']:,} minor, {summary['major_faults']:,} major")
+        print(f"Peak page fault rate - {summary['peak_minor_fault_rate']:,.0f}/s minor, "
+              f"{summary['peak_major_fault_rate']:,.0f}/s major")
+
+    @staticmethod
+    def _publish(sample: Dict[str, float]) -> None:
+        """Publishes a sample of the memory accounting to the metrics registry.
+
+        Args:
+            sample: Sample from the ``MemorySampler``.
+        """
+        for field, documentation in _PUBLISHED.items():
+            REGISTRY.gauge(f'stressinjector_memory_{field}_bytes', documentation).set(sample[field])
+
     def _run(self) -> None:
         """Initiator for stress injector. Converts GigaBytes to Bytes.
 
@@ -121,14 +487,40 @@ class MemoryStress:
             stress: To kick off stress injector with the desired bytes converted from user input.
             memory_util_check: To measure the usage post completion.
         """
-        megabytes = int(self.gigabytes) * 1024  # gigabytes to megabytes
+        size = int(self.gigabytes * 1024 ** 3)  # gigabytes to bytes
+        self._baseline = self._process.memory_info().rss
+        self.report = {'requested': size, 'strategy': self.strategy.value, 'limits': self.limits.as_dict(),
+                       'cap': self.cap}
+        sampler = MemorySampler(interval=self.interval, held=lambda: self.held)
+        done = Event()
+        accounting = Thread(target=sampler.run, args=(done, self._publish), daemon=True)
+        accounting.start()
         try:
-            self.LOGGER.info('Stressing Memory with %d GB', self.gigabytes)
-            time.sleep(1)
-            flush_screen()
-            self.LOGGER.info(self._stress(mb=megabytes) + '\n')
+            if self.profile:
+                self.LOGGER.info("Stressing Memory with '%s' profile for %d seconds",
+                                 self.profile.__class__.__name__, self.profile.duration)
+                del self.report['requested']
+                self.LOGGER.info(self._follow() + '\n')
+            elif self.target is not None or self.hold:
+                del self.report['requested']
+                self.LOGGER.info(self._hold() + '\n')
+            else:
+                size = self._cap(size)
+                self.LOGGER.info('Stressing Memory with %s', size_converter(size))
+                time.sleep(1)
+                flush_screen()
+                self.LOGGER.info(self._stress(size=size) + '\n')
         except KeyboardInterrupt:
             self.LOGGER.warning('Manual interrupt received. Stopping stress.')
             time.sleep(1)
             flush_screen()
-        self.LOGGER.info('Actual memory Consumed: %s', _size_converter(self._memory_util_check()))
+        # a fill can complete within a single interval, so the memory held is sampled before it is released
+        self._publish(sampler.sample())
+        self.report['consumed'] = self._memory_util_check()
+        self._release()
+        done.set()
+        accounting.join()
+        self._publish(sampler.sample())
+        self.report['accounting'] = {'summary': sampler.summary(), 'series': sampler.series()}
+        self.LOGGER.info('Actual memory Consumed: %s', size_converter(self.report['consumed']))
+        self._log_accounting(self.report['accounting']['summary'])
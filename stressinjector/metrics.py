@@ -0,0 +1,463 @@
+import bisect
+import json
+import math
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Event, Lock, Thread, get_ident
+from typing import Any, Dict, List, Sequence, Tuple, Type
+
+from .telemetry import Sampler
+
+# Upper bounds of the histogram buckets in seconds, from a millisecond to ten seconds.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    """Escapes a label value for the Prometheus text format."""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value: float) -> str:
+    """Formats a value for the Prometheus text format."""
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    """Base for the metrics, that are identified by a name and a set of labels.
+
+    >>> Metric
+
+    """
+
+    kind: str
+
+    def __init__(self, name: str, documentation: str = '', labels: Dict[str, str] = None):
+        """Instantiates the members of the class.
+
+        Args:
+            name: Name of the metric.
+            documentation: Description of the metric.
+            labels: Labels that tell this series apart from the other series of the metric.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = {key: str(value) for key, value in (labels or {}).items()}
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        """Returns the name, labels and value of each sample in the series. Implemented by each metric."""
+        raise NotImplementedError
+
+    def snapshot(self) -> Any:
+        """Returns the current value of the series. Implemented by each metric."""
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """Monotonic counter, that is incremented without taking a lock.
+
+    >>> Counter
+
+    Each thread increments its own cell, and the cells are only summed when the counter is read. A lock is taken once
+    per thread, to create its cell.
+    """
+
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        """Instantiates the members of the class."""
+        super().__init__(*args, **kwargs)
+        self._cells: Dict[int, List[float]] = {}
+        self._lock = Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        """Increments the counter.
+
+        Args:
+            amount: Amount to add, which cannot be negative.
+        """
+        if (cell := self._cells.get(get_ident())) is None:
+            with self._lock:
+                cell = self._cells.setdefault(get_ident(), [0])
+        cell[0] += amount
+
+    @property
+    def value(self) -> float:
+        """Sum of the cells of all the threads."""
+        return sum(cell[0] for cell in list(self._cells.values()))
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        """Returns the total of the counter."""
+        return [(self.name, self.labels, self.value)]
+
+    def snapshot(self) -> float:
+        """Returns the total of the counter."""
+        return self.value
+
+
+class Gauge(Metric):
+    """Value that is set to the latest reading, and can go up and down.
+
+    >>> Gauge
+
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, *args, **kwargs):
+        """Instantiates the members of the class."""
+        super().__init__(*args, **kwargs)
+        self.value = 0
+        self._lock = Lock()
+
+    def set(self, value: float) -> None:
+        """Sets the gauge to a value.
+
+        Args:
+            value: Latest reading.
+        """
+        self.value = value
+
+    def inc(self, amount: float = 1) -> None:
+        """Increments the gauge, or decrements it with a negative amount.
+
+        Args:
+            amount: Amount to add.
+        """
+        with self._lock:
+            self.value += amount
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        """Returns the value of the gauge."""
+        return [(self.name, self.labels, self.value)]
+
+    def snapshot(self) -> float:
+        """Returns the value of the gauge."""
+        return self.value
+
+
+class Histogram(Metric):
+    """Histogram with fixed bucket bounds, that records values without taking a lock.
+
+    >>> Histogram
+
+    Each thread records into its own cell, which holds a count for each bucket followed by the sum and the count of the
+    values. The cells are only merged when the histogram is read.
+
+    See Also:
+        The stressors keep their precise latency distribution in :class:`~stressinjector.results.Histogram`. This one
+        uses the coarse cumulative buckets of the Prometheus format, so that it can be aggregated by the dashboards.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        """Instantiates the members of the class.
+
+        Args:
+            buckets: Upper bounds of the buckets in increasing order. A bucket for infinity is always added.
+        """
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        self._cells: Dict[int, List[float]] = {}
+        self._lock = Lock()
+
+    def observe(self, value: float, count: int = 1) -> None:
+        """Records a value.
+
+        Args:
+            value: Value to record.
+            count: Number of times the value was seen.
+        """
+        if (cell := self._cells.get(get_ident())) is None:
+            with self._lock:
+                cell = self._cells.setdefault(get_ident(), [0] * (len(self.buckets) + 3))
+        cell[bisect.bisect_left(self.buckets, value)] += count
+        cell[-2] += value * count
+        cell[-1] += count
+
+    def _merged(self) -> List[float]:
+        """Merges the cells of all the threads."""
+        merged = [0] * (len(self.buckets) + 3)
+        for cell in list(self._cells.values()):
+            merged = [total + value for total, value in zip(merged, cell)]
+        return merged
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        """Returns the cumulative count of each bucket, along with the sum and the count."""
+        merged = self._merged()
+        samples, cumulative = [], 0
+        for bound, count in zip(self.buckets + (math.inf,), merged):
+            cumulative += count
+            samples.append((f'{self.name}_bucket', dict(self.labels, le=_number(bound)), cumulative))
+        samples.append((f'{self.name}_sum', self.labels, merged[-2]))
+        samples.append((f'{self.name}_count', self.labels, merged[-1]))
+        return samples
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Returns the count, the sum and the cumulative count of each bucket."""
+        merged = self._merged()
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets + (math.inf,), merged):
+            cumulative += count
+            buckets[_number(bound)] = cumulative
+        return {'count': merged[-1], 'sum': merged[-2], 'buckets': buckets}
+
+
+class Registry:
+    """Collection of the metrics published by the stressors.
+
+    >>> Registry
+
+    Metrics are created on first use and returned as is afterwards, so the stressors can look them up by name and
+    labels. The lookup takes a lock, so the hot paths hold on to the metrics instead of looking them up each time.
+    """
+
+    def __init__(self):
+        """Instantiates the members of the class."""
+        self._metrics: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Metric] = {}
+        self._lock = Lock()
+
+    def _get(self, metric_class: Type[Metric], name: str, documentation: str, labels: Dict[str, Any],
+             **kwargs) -> Metric:
+        """Returns the series of a metric, and creates it on first use.
+
+        Args:
+            metric_class: Type of the metric.
+            name: Name of the metric.
+            documentation: Description of the metric.
+            labels: Labels of the series.
+            kwargs: Keyword arguments for the metric.
+
+        Returns:
+            Metric:
+            Series with the name and labels.
+        """
+        key = (name, tuple(sorted((label, str(value)) for label, value in labels.items())))
+        with self._lock:
+            if (metric := self._metrics.get(key)) is None:
+                for (other, _), existing in self._metrics.items():
+                    if other == name and existing.kind != metric_class.kind:
+                        raise ValueError(f"\n\nbad metric: {name} is already a {existing.kind}"
+                                         f"\n\nallowed: {existing.kind}")
+                metric = self._metrics[key] = metric_class(name, documentation, labels, **kwargs)
+            elif not isinstance(metric, metric_class):
+                raise ValueError(f"\n\nbad metric: {name} is already a {metric.kind}\n\nallowed: {metric.kind}")
+        return metric
+
+    def counter(self, name: str, documentation: str = '', **labels) -> Counter:
+        """Returns a counter, and creates it on first use.
+
+        Args:
+            name: Name of the counter, which ends with ``_total`` by convention.
+            documentation: Description of the counter.
+            labels: Labels of the series.
+        """
+        return self._get(Counter, name, documentation, labels)
+
+    def gauge(self, name: str, documentation: str = '', **labels) -> Gauge:
+        """Returns a gauge, and creates it on first use.
+
+        Args:
+            name: Name of the gauge.
+            documentation: Description of the gauge.
+            labels: Labels of the series.
+        """
+        return self._get(Gauge, name, documentation, labels)
+
+    def histogram(self, name: str, documentation: str = '', buckets: Sequence[float] = DEFAULT_BUCKETS,
+                  **labels) -> Histogram:
+        """Returns a histogram, and creates it on first use.
+
+        Args:
+            name: Name of the histogram.
+            documentation: Description of the histogram.
+            buckets: Upper bounds of the buckets, used when the histogram is created.
+            labels: Labels of the series.
+        """
+        return self._get(Histogram, name, documentation, labels, buckets=buckets)
+
+    def collect(self) -> List[Metric]:
+        """Returns all the series, ordered by name."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return sorted(metrics, key=lambda metric: metric.name)
+
+    def to_prometheus(self) -> str:
+        """Renders all the series in the Prometheus text exposition format.
+
+        Returns:
+            str:
+            Text with the help and type of each metric, followed by its samples.
+        """
+        lines, described = [], set()
+        for metric in self.collect():
+            if metric.name not in described:
+                described.add(metric.name)
+                lines.append(f'# HELP {metric.name} {metric.documentation}')
+                lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                label_text = ','.join(f'{key}="{_escape(label)}"' for key, label in labels.items())
+                lines.append(f'{name}{{{label_text}}} {_number(value)}' if label_text else f'{name} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns the current value of all the series.
+
+        Returns:
+            dict:
+            Value of each series, keyed by its name and labels as in the Prometheus format.
+        """
+        values = {}
+        for metric in self.collect():
+            label_text = ','.join(f'{key}="{_escape(label)}"' for key, label in metric.labels.items())
+            values[f'{metric.name}{{{label_text}}}' if label_text else metric.name] = metric.snapshot()
+        return values
+
+
+REGISTRY = Registry()
+
+
+class PrometheusExporter:
+    """Local HTTP endpoint, that serves the metrics in the Prometheus text format on ``/metrics``.
+
+    >>> PrometheusExporter
+
+    The server runs in a background thread, from ``start()`` until ``stop()``, or within a ``with`` block.
+
+    Examples:
+        >>> with PrometheusExporter(port=9464):
+        ...     CPUStress(seconds=60)
+    """
+
+    def __init__(self, port: int = 9464, host: str = '127.0.0.1', registry: Registry = REGISTRY):
+        """Instantiates the members of the class.
+
+        Args:
+            port: Port to listen on. Use 0 to pick a free port, which is set on ``port`` once started.
+            host: Interface to listen on. Defaults to the loopback interface.
+            registry: Registry to serve.
+        """
+        self.port = port
+        self.host = host
+        self.registry = registry
+        self._server = None
+        self._thread = None
+
+    def _handler(self) -> Type[BaseHTTPRequestHandler]:
+        """Builds the request handler, bound to the registry of the exporter."""
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            """Request handler, that serves the registry on ``/metrics``."""
+
+            def do_GET(self) -> None:  # noqa: N802
+                """Responds with the metrics, or a 404 for any other path."""
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args) -> None:
+                """Keeps the scrapes out of the logs."""
+
+        return Handler
+
+    def start(self) -> "PrometheusExporter":
+        """Starts the server in a background thread.
+
+        Returns:
+            PrometheusExporter:
+            The same exporter object, to allow chaining.
+        """
+        self._server = ThreadingHTTPServer((self.host, self.port), self._handler())
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = Thread(target=self._server.serve_forever, name=self.__class__.__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stops the server."""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self) -> "PrometheusExporter":
+        """Starts the server when entering the context."""
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        """Stops the server when exiting the context."""
+        self.stop()
+
+
+class JSONLWriter(Sampler):
+    """Periodic writer, that appends a snapshot of the metrics to a JSON lines file.
+
+    >>> JSONLWriter
+
+    Each line has the ``time`` as seconds since the epoch, along with the ``metrics`` as returned by
+    :meth:`Registry.to_dict`. A last snapshot is written when the writer is stopped.
+    """
+
+    def __init__(self, filename: str, interval: float = 1.0, registry: Registry = REGISTRY):
+        """Instantiates the members of the class.
+
+        Args:
+            filename: File to append the snapshots to.
+            interval: Seconds between snapshots.
+            registry: Registry to write.
+        """
+        if interval <= 0:
+            raise ValueError(f"\n\nbad interval: {interval}\n\nallowed: greater than 0")
+        self.filename = filename
+        self.interval = interval
+        self.registry = registry
+        self._file = None
+        self._done = Event()
+        self._thread = None
+
+    def sample(self) -> None:
+        """Appends a snapshot of the metrics to the file."""
+        self._file.write(json.dumps({'time': round(time.time(), 3), 'metrics': self.registry.to_dict()}) + '\n')
+        self._file.flush()
+
+    def start(self) -> "JSONLWriter":
+        """Opens the file and starts writing in a background thread.
+
+        Returns:
+            JSONLWriter:
+            The same writer object, to allow chaining.
+        """
+        self._file = open(self.filename, 'a')
+        self._done.clear()
+        self._thread = Thread(target=self.run, args=(self._done,), name=self.__class__.__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Writes a last snapshot, and closes the file."""
+        if self._file:
+            self._done.set()
+            self._thread.join()
+            self.sample()
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "JSONLWriter":
+        """Starts writing when entering the context."""
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        """Stops writing when exiting the context."""
+        self.stop()
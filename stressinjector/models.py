@@ -51,6 +51,69 @@ class RequestType(str, Enum):
     delete: str = "delete"
 
 
+class EngineType(str, Enum):
+    """Wrapper for URL stress engines."""
+
+    thread: str = "thread"
+    asyncio: str = "asyncio"
+
+
+class ArrivalType(str, Enum):
+    """Wrapper for request arrival processes in the open model."""
+
+    uniform: str = "uniform"
+    poisson: str = "poisson"
+
+
+class SaturationMode(str, Enum):
+    """Wrapper for the load that is stepped up by the saturation search."""
+
+    rps: str = "rps"
+    concurrency: str = "concurrency"
+
+
+class StressorType(str, Enum):
+    """Wrapper for the stressors that can be part of a plan."""
+
+    cpu: str = "cpu"
+    memory: str = "memory"
+    bandwidth: str = "bandwidth"
+    url: str = "url"
+    saturation: str = "saturation"
+
+
+class CPUKernel(str, Enum):
+    """Wrapper for CPU workload kernels."""
+
+    spin: str = "spin"
+    integer: str = "integer"
+    matmul: str = "matmul"
+    cache_l1: str = "cache_l1"
+    cache_l2: str = "cache_l2"
+    cache_llc: str = "cache_llc"
+    branch: str = "branch"
+    hash: str = "hash"
+    compress: str = "compress"
+
+
+class FillStrategy(str, Enum):
+    """Wrapper for memory fill strategies."""
+
+    random: str = "random"
+    generator: str = "generator"
+    zeros: str = "zeros"
+    mmap: str = "mmap"
+
+
+class BandwidthMode(str, Enum):
+    """Wrapper for memory bandwidth access patterns."""
+
+    read: str = "read"
+    write: str = "write"
+    copy: str = "copy"
+    random: str = "random"
+
+
 _supported_systems = (operating_system.macOS, operating_system.linux, operating_system.windows)
 
 if settings.os not in _supported_systems:
@@ -0,0 +1,259 @@
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Type, Union
+
+from .bandwidth import BandwidthStress
+from .controller import Controller
+from .cpu import CPUStress
+from .memory import MemoryStress
+from .models import StressorType
+from .profiles import Bursty, LoadProfile, Ramp, Replay, Sine, Staircase
+from .saturation import Saturation
+from .scenario import HARScenario, JSONLScenario, Scenario, WeightedMix
+from .url import URLStress
+
+STRESSORS: Dict[StressorType, Type[Controller]] = {
+    StressorType.cpu: CPUStress,
+    StressorType.memory: MemoryStress,
+    StressorType.bandwidth: BandwidthStress,
+    StressorType.url: URLStress,
+    StressorType.saturation: Saturation,
+}
+PROFILES: Dict[str, Type[LoadProfile]] = {
+    'ramp': Ramp, 'staircase': Staircase, 'sine': Sine, 'bursty': Bursty, 'replay': Replay
+}
+SCENARIOS: Dict[str, Type[Scenario]] = {'jsonl': JSONLScenario, 'har': HARScenario, 'mix': WeightedMix}
+
+# Keys of a stressor in a plan, that are used by the plan and not passed on to the stressor.
+_PLAN_KEYS = ('type', 'name', 'delay', 'instance')
+
+
+def _timestamp(epoch: float) -> str:
+    """Converts an epoch time into an ISO 8601 timestamp with the local offset.
+
+    Args:
+        epoch: Seconds since the epoch.
+
+    Returns:
+        str:
+        Timestamp with milliseconds.
+    """
+    return datetime.fromtimestamp(epoch).astimezone().isoformat(timespec='milliseconds')
+
+
+def load(filename: str) -> Dict[str, Any]:
+    """Loads a plan from a JSON or a YAML file.
+
+    Args:
+        filename: Plan file, read as YAML for the ``.yaml`` and ``.yml`` extensions, and as JSON otherwise.
+
+    Returns:
+        dict:
+        Plan as a dictionary.
+
+    See Also:
+        YAML requires ``PyYAML``, which can be installed with ``pip install stress-injector[yaml]``.
+    """
+    with open(filename) as file:
+        if os.path.splitext(filename)[1].lower() not in ('.yaml', '.yml'):
+            return json.load(file)
+        try:
+            import yaml
+        except ImportError as error:
+            raise ImportError(f"PyYAML is required to load {filename!r}, "
+                              "install it with 'pip install stress-injector[yaml]'") from error
+        return yaml.safe_load(file)
+
+
+class Plan(Controller):
+    """Controller that runs stressors concurrently in phases, as declared in a plan.
+
+    >>> Plan
+
+    The phases run one after the other, and the stressors within a phase run concurrently. Each stressor has a ``type``
+    (``cpu``, ``memory``, ``bandwidth``, ``url`` or ``saturation``), an optional ``name``, an optional ``delay`` in
+    seconds from the start of its phase, and the keyword arguments of the stressor. A ``profile`` or a ``scenario`` is
+    given as a dictionary with its ``type`` (``ramp``, ``staircase``, ``sine``, ``bursty``, ``replay``, or ``jsonl``,
+    ``har``, ``mix``) and its keyword arguments.
+
+    A phase ends once all its stressors have completed, or after its ``duration`` in seconds, when the stressors that
+    are still running are stopped. The report has the start and the end of the plan, each phase and each stressor as
+    timestamps, along with the report of each stressor, and the error of each stressor that failed.
+
+    Every stressor, along with its profile or scenario, is instantiated along with the plan, so that a bad
+    configuration is rejected before any of the phases run.
+
+    Examples:
+        >>> Plan({
+        ...     'name': 'busy-node',
+        ...     'phases': [
+        ...         {'name': 'baseline', 'stressors': [{'type': 'url', 'url': 'http://0.0.0.0:5002/',
+        ...                                             'duration': 30, 'rps': 100}]},
+        ...         {'name': 'contention', 'duration': 60, 'stressors': [
+        ...             {'type': 'cpu', 'seconds': 60, 'percent': 90},
+        ...             {'type': 'memory', 'target': '75% available', 'hold': 50, 'delay': 5},
+        ...             {'type': 'url', 'url': 'http://0.0.0.0:5002/', 'duration': 60, 'rps': 100},
+        ...         ]},
+        ...     ],
+        ... })
+    """
+
+    def __init__(self, plan: Union[str, Dict[str, Any]], logger: logging.Logger = None, blocking: bool = True):
+        """Instantiates the members of the class.
+
+        Args:
+            plan: Plan as a dictionary, or a JSON or YAML file to load it from.
+            logger: Custom logger.
+            blocking: Runs the plan on instantiation when ``True``, otherwise waits for ``start()``.
+        """
+        if isinstance(plan, str):
+            plan = load(plan)
+        if 'phases' not in plan and 'stressors' in plan:
+            plan = {'name': plan.get('name'), 'phases': [{'stressors': plan['stressors']}]}
+        if not plan.get('phases'):
+            raise ValueError("\n\nbad plan: no phases\n\nallowed: at least one phase with at least one stressor")
+        super().__init__(logger=logger)
+        self.name = plan.get('name') or 'plan'
+        self.phases = [self._validate(index, phase) for index, phase in enumerate(plan['phases'])]
+        for phase in self.phases:
+            for stressor in phase['stressors']:
+                try:
+                    stressor['instance'] = self._build(stressor)
+                except Exception as error:
+                    raise ValueError(f"\n\nbad stressor: {stressor['name']} in {phase['name']}\n\n{error}") from error
+        if blocking:
+            self._run()
+
+    @staticmethod
+    def _validate(index: int, phase: Dict[str, Any]) -> Dict[str, Any]:
+        """Validates a phase, and fills in the default names.
+
+        Args:
+            index: Position of the phase in the plan.
+            phase: Phase as declared in the plan.
+
+        Returns:
+            dict:
+            Copy of the phase, with a name for the phase and for each stressor.
+        """
+        name = phase.get('name') or f'phase-{index + 1}'
+        if not phase.get('stressors'):
+            raise ValueError(f"\n\nbad phase: {name} has no stressors\n\nallowed: at least one stressor")
+        if (duration := phase.get('duration')) is not None and duration <= 0:
+            raise ValueError(f"\n\nbad duration: {duration} in {name}\n\nallowed: greater than 0")
+        stressors = []
+        for position, stressor in enumerate(phase['stressors']):
+            kind = stressor.get('type')
+            if kind not in StressorType.__members__.keys():
+                raise ValueError(
+                    f"\n\nbad type: {kind} in {name}\n\nallowed: {', '.join(StressorType.__members__.keys())}"
+                )
+            if stressor.get('delay', 0) < 0:
+                raise ValueError(f"\n\nbad delay: {stressor['delay']} in {name}\n\nallowed: 0 or greater")
+            for key, registry in (('profile', PROFILES), ('scenario', SCENARIOS)):
+                if key in stressor and stressor[key].get('type') not in registry:
+                    raise ValueError(
+                        f"\n\nbad {key}: {stressor[key].get('type')} in {name}\n\nallowed: {', '.join(registry)}"
+                    )
+            stressors.append(dict(stressor, name=stressor.get('name') or f'{kind}-{position + 1}'))
+        return dict(phase, name=name, stressors=stressors)
+
+    def _build(self, stressor: Dict[str, Any]) -> Controller:
+        """Instantiates a stressor of the plan, without starting it.
+
+        Args:
+            stressor: Stressor as declared in the plan.
+
+        Returns:
+            Controller:
+            Stressor, that is ready to be started.
+        """
+        kwargs = {key: value for key, value in stressor.items() if key not in _PLAN_KEYS}
+        for key, registry in (('profile', PROFILES), ('scenario', SCENARIOS)):
+            if key in kwargs:
+                options = dict(kwargs[key])
+                kwargs[key] = registry[options.pop('type')](**options)
+        return STRESSORS[StressorType(stressor['type'])](logger=self.LOGGER, blocking=False, **kwargs)
+
+    def _run_phase(self, phase: Dict[str, Any], origin: float) -> Dict[str, Any]:
+        """Runs the stressors of a phase, each after its delay, until they complete or the phase runs out of time.
+
+        Args:
+            phase: Phase to run.
+            origin: Epoch time of the start of the plan, to compute the offsets.
+
+        Returns:
+            dict:
+            Report of the phase.
+        """
+        started = time.time()
+        start = time.monotonic()
+        deadline = start + phase['duration'] if phase.get('duration') else None
+        pending = sorted(phase['stressors'], key=lambda stressor: stressor.get('delay', 0))
+        active: List[Dict[str, Any]] = []
+        self.LOGGER.info("Starting phase %s with %d stressors", phase['name'], len(pending))
+        try:
+            while not self._stop_event.is_set():
+                now = time.monotonic()
+                if deadline and now >= deadline:
+                    break
+                while pending and now - start >= pending[0].get('delay', 0):
+                    stressor = pending.pop(0)
+                    instance = stressor['instance'].start()
+                    active.append({'name': stressor['name'], 'type': stressor['type'], 'instance': instance,
+                                   'started': time.time(), 'finished': None})
+                for entry in active:
+                    if entry['finished'] is None and not entry['instance'].running:
+                        entry['finished'] = time.time()
+                if not pending and all(entry['finished'] for entry in active):
+                    break
+                self._stop_event.wait(0.1)
+        finally:
+            for entry in active:
+                entry['instance'].stop()
+            for entry in active:
+                entry['instance'].wait()
+                entry['finished'] = entry['finished'] or time.time()
+        finished = time.time()
+        if pending:
+            self.LOGGER.warning("phase %s ended before %s could start", phase['name'],
+                                ', '.join(stressor['name'] for stressor in pending))
+        return {
+            'name': phase['name'], 'started': _timestamp(started), 'finished': _timestamp(finished),
+            'offset': round(started - origin, 3), 'run_time': round(finished - started, 3),
+            'stressors': [
+                {'name': entry['name'], 'type': entry['type'], 'started': _timestamp(entry['started']),
+                 'finished': _timestamp(entry['finished']), 'offset': round(entry['started'] - origin, 3),
+                 'run_time': round(entry['finished'] - entry['started'], 3), 'report': entry['instance'].report,
+                 **({'error': repr(entry['instance'].error)} if entry['instance'].error else {})}
+                for entry in active
+            ],
+            'skipped': [stressor['name'] for stressor in pending],
+        }
+
+    def _print_report(self) -> None:
+        """Prints the timeline of the phases and the stressors."""
+        print(f"Plan {self.report['name']} - {self.report['started']} to {self.report['finished']}")
+        for phase in self.report['phases']:
+            print(f"  {phase['name']} - {phase['run_time']}s from +{phase['offset']}s")
+            for stressor in phase['stressors']:
+                print(f"    {stressor['name']} ({stressor['type']}) - {stressor['run_time']}s from "
+                      f"+{stressor['offset']}s")
+
+    def _run(self) -> None:
+        """Runs the phases one after the other, until the plan completes or a stop is requested."""
+        origin = time.time()
+        self.report = {'name': self.name, 'started': _timestamp(origin), 'phases': []}
+        try:
+            for phase in self.phases:
+                if self._stop_event.is_set():
+                    self.LOGGER.warning("stop requested, remaining phases were not run")
+                    break
+                self.report['phases'].append(self._run_phase(phase, origin))
+        finally:
+            finished = time.time()
+            self.report.update(finished=_timestamp(finished), run_time=round(finished - origin, 3))
+        self._print_report()
@@ -0,0 +1,211 @@
+import csv
+import math
+import time
+from threading import Event
+from typing import Callable, Dict, List, Union
+
+import numpy
+
+
+class LoadProfile:
+    """Base for load profiles, that map the seconds elapsed since the start of a run to a stress level.
+
+    >>> LoadProfile
+
+    The unit of the level depends on the stressor, a percentage for ``CPUStress`` and gigabytes for ``MemoryStress``.
+    """
+
+    duration: float = 0
+
+    def level(self, elapsed: float) -> float:
+        """Returns the stress level at a point in time. Implemented by each profile.
+
+        Args:
+            elapsed: Seconds elapsed since the start of the run.
+        """
+        raise NotImplementedError
+
+
+class Ramp(LoadProfile):
+    """Linear ramp from a start level to an end level.
+
+    >>> Ramp
+
+    """
+
+    def __init__(self, start: float, end: float, duration: float):
+        """Instantiates the members of the class.
+
+        Args:
+            start: Level at the beginning of the ramp.
+            end: Level at the end of the ramp.
+            duration: Length of the ramp in seconds.
+        """
+        self.start = start
+        self.end = end
+        self.duration = duration
+
+    def level(self, elapsed: float) -> float:
+        """Returns the level interpolated between the start and the end."""
+        return self.start + (self.end - self.start) * min(elapsed / self.duration, 1.0)
+
+
+class Staircase(LoadProfile):
+    """Staircase that holds each level for a fixed number of seconds.
+
+    >>> Staircase
+
+    """
+
+    def __init__(self, levels: List[float], step: float):
+        """Instantiates the members of the class.
+
+        Args:
+            levels: Levels in the order they have to be applied.
+            step: Seconds to hold each level.
+        """
+        self.levels = levels
+        self.step = step
+        self.duration = len(levels) * step
+
+    def level(self, elapsed: float) -> float:
+        """Returns the level of the current step."""
+        return self.levels[min(int(elapsed // self.step), len(self.levels) - 1)]
+
+
+class Sine(LoadProfile):
+    """Sine wave between a low and a high level, to mimic diurnal load in a compressed time frame.
+
+    >>> Sine
+
+    """
+
+    def __init__(self, low: float, high: float, period: float, duration: float):
+        """Instantiates the members of the class.
+
+        Args:
+            low: Level at the trough of the wave, which is where the wave starts.
+            high: Level at the crest of the wave.
+            period: Seconds for one full cycle.
+            duration: Length of the run in seconds.
+        """
+        self.low = low
+        self.high = high
+        self.period = period
+        self.duration = duration
+
+    def level(self, elapsed: float) -> float:
+        """Returns the level on the wave."""
+        return self.low + (self.high - self.low) * (1 - math.cos(2 * math.pi * elapsed / self.period)) / 2
+
+
+class Bursty(LoadProfile):
+    """Base level with periodic bursts to a peak level.
+
+    >>> Bursty
+
+    """
+
+    def __init__(self, base: float, peak: float, burst: float, every: float, duration: float):
+        """Instantiates the members of the class.
+
+        Args:
+            base: Level outside of the bursts.
+            peak: Level during the bursts.
+            burst: Seconds each burst lasts.
+            every: Seconds between the start of two bursts.
+            duration: Length of the run in seconds.
+        """
+        self.base = base
+        self.peak = peak
+        self.burst = burst
+        self.every = every
+        self.duration = duration
+
+    def level(self, elapsed: float) -> float:
+        """Returns the peak level during a burst, and the base level otherwise."""
+        return self.peak if elapsed % self.every < self.burst else self.base
+
+
+class Replay(LoadProfile):
+    """Replay of a recorded utilization trace from a CSV file, interpolated linearly between the samples.
+
+    >>> Replay
+
+    """
+
+    def __init__(self, filename: str, time_column: str = 'time', level_column: str = 'level', speed: float = 1.0):
+        """Instantiates the members of the class and loads the trace.
+
+        Args:
+            filename: CSV file with a header row.
+            time_column: Column with the seconds since the start of the trace.
+            level_column: Column with the level at that point in time.
+            speed: Factor to speed up or slow down the replay.
+        """
+        with open(filename, newline='') as file:
+            rows = [(float(row[time_column]), float(row[level_column])) for row in csv.DictReader(file)]
+        if not rows:
+            raise ValueError(f"\n\nbad trace: {filename}\n\nno samples found")
+        rows.sort()
+        start = rows[0][0]
+        self.times = numpy.array([(row[0] - start) / speed for row in rows])
+        self.levels = numpy.array([row[1] for row in rows])
+        self.duration = float(self.times[-1])
+
+    def level(self, elapsed: float) -> float:
+        """Returns the level interpolated from the trace."""
+        return float(numpy.interp(elapsed, self.times, self.levels))
+
+
+class Scheduler:
+    """Drives a stress level over time by applying the level from a load profile on a fixed schedule.
+
+    >>> Scheduler
+
+    Ticks are scheduled against absolute deadlines on the monotonic clock, so the delay of one tick does not carry over
+    to the next, and the lateness of each tick is tracked as jitter.
+    """
+
+    def __init__(self, profile: LoadProfile, apply: Callable[[float], None], resolution: float = 0.1):
+        """Instantiates the members of the class.
+
+        Args:
+            profile: Load profile to follow.
+            apply: Function that applies a level on the stressor.
+            resolution: Seconds between two level changes.
+        """
+        self.profile = profile
+        self.apply = apply
+        self.resolution = resolution
+        self.ticks = 0
+        self.max_jitter = 0.0
+        self._jitter = 0.0
+
+    def run(self, stop: Event) -> None:
+        """Applies the levels until the end of the profile, or until the event is set.
+
+        Args:
+            stop: Event that stops the scheduler, once set.
+        """
+        start = time.monotonic()
+        deadline = start
+        while True:
+            now = time.monotonic()
+            elapsed = now - start
+            if elapsed >= self.profile.duration:
+                break
+            lateness = max(now - deadline, 0.0)
+            self.max_jitter = max(self.max_jitter, lateness)
+            self._jitter += lateness
+            self.ticks += 1
+            self.apply(self.profile.level(elapsed))
+            deadline += self.resolution
+            if stop.wait(max(min(deadline, start + self.profile.duration) - time.monotonic(), 0)):
+                break
+
+    @property
+    def report(self) -> Dict[str, Union[int, float]]:
+        """Number of ticks applied, along with the mean and max jitter in milliseconds."""
+        return {'ticks': self.ticks, 'mean_jitter_ms': round(self._jitter * 1e3 / max(self.ticks, 1), 3),
+                'max_jitter_ms': round(self.max_jitter * 1e3, 3)}
@@ -0,0 +1,235 @@
+import math
+import time
+from typing import Any, Dict, List, Optional
+
+QUANTILES = {'p50': 0.5, 'p90': 0.9, 'p99': 0.99, 'p99.9': 0.999}
+PHASES = ('dns', 'connect', 'tls', 'ttfb', 'body')
+
+
+class Histogram:
+    """Log-bucketed latency histogram in the style of HdrHistogram, with a fixed relative precision.
+
+    >>> Histogram
+
+    Each bucket is ``GROWTH`` times wider than the previous one, starting at ``LOWEST`` seconds. This keeps the error of
+    every quantile within 1% of the value, with about 1,100 buckets covering a microsecond to an hour. Only the buckets
+    that were hit are stored, so the memory is bounded by the range of the latencies and not by the number of requests.
+    """
+
+    LOWEST = 1e-6
+    GROWTH = 1.02
+    _LOG_GROWTH = math.log(GROWTH)
+
+    def __init__(self):
+        """Instantiates the members of the class."""
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def record(self, value: float) -> None:
+        """Records a value.
+
+        Args:
+            value: Value in seconds.
+        """
+        index = int(math.log(value / self.LOWEST) / self._LOG_GROWTH) if value > self.LOWEST else 0
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "Histogram") -> "Histogram":
+        """Merges the values of another histogram into this one.
+
+        Args:
+            other: Histogram to merge.
+
+        Returns:
+            Histogram:
+            The same histogram object, to allow chaining.
+        """
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, quantile: float) -> Optional[float]:
+        """Returns the value at a quantile, from the midpoint of the bucket it falls in.
+
+        Args:
+            quantile: Quantile between 0 and 1.
+
+        Returns:
+            float:
+            Value in seconds, or ``None`` if nothing was recorded.
+        """
+        if not self.count:
+            return None
+        rank = quantile * self.count
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(max(self.LOWEST * self.GROWTH ** (index + 0.5), self.min), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        """Summarizes the histogram.
+
+        Returns:
+            Dict[str, Optional[float]]:
+            Count, min, mean, quantiles and max in milliseconds.
+        """
+        if not self.count:
+            return {'count': 0, 'min': None, 'mean': None, **dict.fromkeys(QUANTILES), 'max': None}
+        return {'count': self.count, 'min': round(self.min * 1e3, 3), 'mean': round(self.sum * 1e3 / self.count, 3),
+                **{name: round(self.quantile(quantile) * 1e3, 3) for name, quantile in QUANTILES.items()},
+                'max': round(self.max * 1e3, 3)}
+
+
+class Results:
+    """Compact record of the requests sent by a worker, that can be merged across workers and processes.
+
+    >>> Results
+
+    Records the counts by status code and by exception type, the bytes received, a latency histogram and a per-second
+    timeline. In the open model, the lag between the time each request was due and the time it was sent is recorded in
+    a second histogram. With phase timing, the time spent on each phase of the requests, such as the DNS lookup or
+    the time to first byte, is recorded in a histogram for each phase. Memory is bounded by the duration of the run and
+    not by the number of requests, so the results are cheap to send from a worker process to the parent.
+    """
+
+    def __init__(self):
+        """Instantiates the members of the class."""
+        self.success = 0
+        self.errors = 0
+        self.bytes = 0
+        self.status: Dict[int, int] = {}
+        self.exceptions: Dict[str, int] = {}
+        self.latency = Histogram()
+        self.lag = Histogram()
+        self.phases: Dict[str, Histogram] = {}
+        self.timeline: Dict[int, List[float]] = {}  # second -> [success, errors, responses, latency sum, latency max]
+
+    def _tick(self, ok: bool, latency: float = None) -> None:
+        """Counts a request in the timeline, against the wall clock second it completed in.
+
+        Args:
+            ok: Flag to indicate if the request was successful.
+            latency: Latency of the request, if it received a response.
+        """
+        second = int(time.time())
+        if (counts := self.timeline.get(second)) is None:
+            counts = self.timeline[second] = [0, 0, 0, 0.0, 0.0]
+        counts[0 if ok else 1] += 1
+        if latency is not None:
+            counts[2] += 1
+            counts[3] += latency
+            if latency > counts[4]:
+                counts[4] = latency
+
+    def record(self, latency: float, status: int, size: int = 0) -> None:
+        """Records a request that received a response.
+
+        Args:
+            latency: Seconds from sending the request to receiving the response.
+            status: Status code of the response.
+            size: Number of bytes in the body of the response.
+        """
+        ok = status < 400
+        if ok:
+            self.success += 1
+        else:
+            self.errors += 1
+        self.bytes += size
+        self.status[status] = self.status.get(status, 0) + 1
+        self.latency.record(latency)
+        self._tick(ok=ok, latency=latency)
+
+    def record_phase(self, phase: str, seconds: float) -> None:
+        """Records the time spent on a phase of a request.
+
+        Args:
+            phase: Name of the phase.
+            seconds: Seconds spent on the phase.
+        """
+        if (histogram := self.phases.get(phase)) is None:
+            histogram = self.phases[phase] = Histogram()
+        histogram.record(seconds)
+
+    def fail(self, error: Exception) -> None:
+        """Records a request that failed without a response.
+
+        Args:
+            error: Exception raised by the request.
+        """
+        self.errors += 1
+        kind = error.__class__.__name__
+        self.exceptions[kind] = self.exceptions.get(kind, 0) + 1
+        self._tick(ok=False)
+
+    def merge(self, other: "Results") -> "Results":
+        """Merges the results of another worker into this one.
+
+        Args:
+            other: Results to merge.
+
+        Returns:
+            Results:
+            The same results object, to allow chaining.
+        """
+        self.success += other.success
+        self.errors += other.errors
+        self.bytes += other.bytes
+        for status, count in other.status.items():
+            self.status[status] = self.status.get(status, 0) + count
+        for kind, count in other.exceptions.items():
+            self.exceptions[kind] = self.exceptions.get(kind, 0) + count
+        self.latency.merge(other.latency)
+        self.lag.merge(other.lag)
+        for phase, histogram in other.phases.items():
+            self.phases.setdefault(phase, Histogram()).merge(histogram)
+        for second, counts in other.timeline.items():
+            if (merged := self.timeline.get(second)) is None:
+                self.timeline[second] = list(counts)
+                continue
+            for index in range(4):
+                merged[index] += counts[index]
+            merged[4] = max(merged[4], counts[4])
+        return self
+
+    def summary(self) -> Dict[str, Any]:
+        """Summarizes the results.
+
+        Returns:
+            Dict[str, Any]:
+            Counts, bytes received, latency, lag and phases in milliseconds, and the timeline with the seconds since the
+            first request.
+        """
+        start = min(self.timeline, default=0)
+        timeline = [
+            {'second': second - start, 'success': success, 'errors': errors,
+             'mean_ms': round(latency_sum * 1e3 / responses, 3) if responses else None,
+             'max_ms': round(latency_max * 1e3, 3) if responses else None}
+            for second, (success, errors, responses, latency_sum, latency_max) in sorted(self.timeline.items())
+        ]
+        return {
+            'success': self.success,
+            'errors': self.errors,
+            'bytes': self.bytes,
+            'status': dict(sorted(self.status.items())),
+            'exceptions': dict(sorted(self.exceptions.items(), key=lambda item: -item[1])),
+            'latency': self.latency.summary(),
+            **({'lag': self.lag.summary()} if self.lag.count else {}),
+            **({'phases': {phase: self.phases[phase].summary() for phase in PHASES if phase in self.phases}}
+               if self.phases else {}),
+            'timeline': timeline,
+        }
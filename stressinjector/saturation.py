@@ -0,0 +1,173 @@
+import logging
+from typing import Any, Dict, Optional
+
+from .controller import Controller
+from .models import SaturationMode
+from .url import URLStress
+
+
+class Saturation(Controller):
+    """Controller that steps the load on a URL upward in stages, to find where the service saturates.
+
+    >>> Saturation
+
+    Each stage runs :class:`~stressinjector.url.URLStress` at a higher level than the previous one. The level is the
+    arrival rate in the ``rps`` mode, or the number of concurrent requests in the ``concurrency`` mode. The search
+    stops at the first stage that crosses a limit:
+
+    - **latency**: p99 latency above ``slo_p99_ms``.
+    - **errors**: Share of failed requests above ``max_error_rate``.
+    - **plateau**: Throughput gained over the previous stage is less than ``plateau`` of the load that was added, or
+      the achieved rate fell below 95% of the requested rate in the ``rps`` mode.
+
+    The report includes the stats of each stage, the knee, which is the last stage within the limits, and the maximum
+    sustainable throughput.
+
+    See Also:
+        Keyword arguments that are not used by the search, such as ``engine``, ``processes``, ``timeout``,
+        ``request_type`` or ``scenario``, are passed on to each stage.
+    """
+
+    def __init__(self, url: str, mode: str = SaturationMode.rps, start: float = 100, step: float = None,
+                 stages: int = 10, stage_seconds: float = 30, slo_p99_ms: float = None, max_error_rate: float = 0.01,
+                 plateau: float = 0.25, concurrency: int = 256, logger: logging.Logger = None, blocking: bool = True,
+                 **kwargs):
+        """Instantiates the members of the class.
+
+        Args:
+            url: URL to inject stress.
+            mode: Load to step up, arrival rate with ``rps`` or concurrent requests with ``concurrency``.
+            start: Level of the first stage.
+            step: Level added on each stage. Defaults to the level of the first stage.
+            stages: Maximum number of stages.
+            stage_seconds: Seconds each stage runs for.
+            slo_p99_ms: Limit for the p99 latency in milliseconds. Defaults to no limit.
+            max_error_rate: Limit for the share of failed requests. Defaults to 1%.
+            plateau: Minimum share of the load added on each stage, that has to show up as throughput. Defaults to 25%.
+            concurrency: Maximum number of requests in flight in the ``rps`` mode. Defaults to 256.
+            logger: Custom logger.
+            blocking: Runs the search on instantiation when ``True``, otherwise waits for ``start()``.
+            kwargs: Keyword arguments for each stage.
+        """
+        if mode not in SaturationMode.__members__.keys():
+            raise ValueError(
+                f"\n\nbad mode: {mode}\n\nallowed: {', '.join(SaturationMode.__members__.keys())}"
+            )
+        if start <= 0 or (step is not None and step <= 0) or stages < 1 or stage_seconds <= 0:
+            raise ValueError(
+                f"\n\nbad stages: start={start}, step={step}, stages={stages}, stage_seconds={stage_seconds}"
+                "\n\nallowed: greater than 0"
+            )
+        super().__init__(logger=logger)
+        self.url = url
+        self.mode = SaturationMode(mode)
+        self.start_level = start
+        self.step = step or start
+        self.stages = int(stages)
+        self.stage_seconds = stage_seconds
+        self.slo_p99_ms = slo_p99_ms
+        self.max_error_rate = max_error_rate
+        self.plateau = plateau
+        self.concurrency = concurrency
+        self.kwargs = kwargs
+        if blocking:
+            self._run()
+
+    def _stage(self, level: float) -> Dict[str, Any]:
+        """Runs a single stage at a level.
+
+        Args:
+            level: Arrival rate or number of concurrent requests.
+
+        Returns:
+            Dict[str, Any]:
+            Report from ``URLStress``, or an empty dictionary if the sample call failed.
+        """
+        if self.mode == SaturationMode.rps:
+            stress = URLStress(url=self.url, duration=self.stage_seconds, rps=level, concurrency=self.concurrency,
+                               logger=self.LOGGER, blocking=False, **self.kwargs)
+        else:
+            stress = URLStress(url=self.url, rate=10 ** 12, duration=self.stage_seconds, concurrency=int(level),
+                               logger=self.LOGGER, blocking=False, **self.kwargs)
+        stress.start()
+        while stress.running:
+            if self._stop_event.wait(0.1):
+                stress.stop()
+        return stress.wait()
+
+    def _check(self, level: float, report: Dict[str, Any], best: float) -> Optional[str]:
+        """Checks the stats of a stage against the limits.
+
+        Args:
+            level: Level of the stage.
+            report: Stats of the stage.
+            best: Best throughput of the previous stages.
+
+        Returns:
+            str:
+            Limit that was crossed, or ``None`` if the stage is within the limits.
+
+        See Also:
+            The load added is the step itself in the ``rps`` mode. In the ``concurrency`` mode, it is the throughput the
+            step would add if the latency stayed the same, which is the best throughput scaled by the step.
+        """
+        if not report['requests'] or report['error_rate'] > self.max_error_rate:
+            return 'errors'
+        if self.slo_p99_ms is not None and report['p99_ms'] > self.slo_p99_ms:
+            return 'latency'
+        previous = level - self.step
+        if best and previous > 0:
+            added = self.step if self.mode == SaturationMode.rps else best * self.step / previous
+            if report['throughput'] - best < self.plateau * added:
+                return 'plateau'
+        if self.mode == SaturationMode.rps and report['achieved_rps'] < level * 0.95:
+            return 'plateau'
+        return None
+
+    def _print_report(self) -> None:
+        """Prints the stats of each stage, along with the knee."""
+        for stage in self.report['stages']:
+            print(f"Stage {stage['stage']} - {self.mode.value}: {stage['level']} - throughput: {stage['throughput']} "
+                  f"requests/s - p99: {stage['p99_ms']} ms - errors: {stage['error_rate']:.2%} - "
+                  f"{stage['breach'] or 'ok'}")
+        if knee := self.report['knee']:
+            print(f"Knee - {self.mode.value}: {knee['level']} - max sustainable throughput: "
+                  f"{self.report['max_sustainable_throughput']} requests/s")
+        else:
+            print("Knee - not found, the first stage crossed a limit")
+
+    def _run(self) -> None:
+        """Runs the stages until a limit is crossed, the stages run out or a stop is requested."""
+        self.report = {'mode': self.mode.value, 'stages': [], 'knee': None, 'max_sustainable_throughput': None,
+                       'breach': None}
+        best = 0.0
+        for index in range(self.stages):
+            if self._stop_event.is_set():
+                break
+            level = self.start_level + self.step * index
+            self.LOGGER.info("Saturation stage %d with %s at %s", index + 1, self.mode.value, level)
+            result = self._stage(level=level)
+            requests = result.get('success', 0) + result.get('errors', 0)
+            stage = {
+                'stage': index + 1, 'level': level, 'requests': requests,
+                'throughput': result.get('throughput', 0.0),
+                'achieved_rps': result.get('achieved_rps', result.get('throughput', 0.0)),
+                'error_rate': round(result['errors'] / requests, 4) if requests else 1.0,
+                'p50_ms': result.get('latency', {}).get('p50'), 'p99_ms': result.get('latency', {}).get('p99'),
+                'lag_p99_ms': result.get('lag', {}).get('p99'),
+            }
+            if self._stop_event.is_set():
+                stage['breach'] = None
+                self.report['stages'].append(stage)
+                break
+            stage['breach'] = self._check(level=level, report=stage, best=best)
+            self.report['stages'].append(stage)
+            if stage['breach']:
+                self.report['breach'] = {'stage': index + 1, 'level': level, 'reason': stage['breach']}
+                break
+            best = max(best, stage['throughput'])
+            self.report['knee'] = {'stage': index + 1, 'level': level, 'throughput': stage['throughput'],
+                                   'p99_ms': stage['p99_ms']}
+            self.report['max_sustainable_throughput'] = best
+        self.LOGGER.info('Saturation Report:')
+        self._print_report()
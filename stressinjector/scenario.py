@@ -0,0 +1,185 @@
+import itertools
+import json
+import random
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple
+
+# Headers in recorded requests that are set by the client for each connection, and are not replayed.
+_SKIP_HEADERS = {'host', 'content-length', 'connection', 'keep-alive', 'transfer-encoding'}
+
+
+class RequestSpec(NamedTuple):
+    """Wrapper for a single request in a scenario."""
+
+    method: str
+    url: str
+    kwargs: Dict[str, Any]
+
+
+class Scenario:
+    """Base for the scenarios, that produce the requests to send lazily, one at a time.
+
+    >>> Scenario
+
+    URLs can be relative, in which case they are resolved against the URL given to ``URLStress``. Requests are pulled
+    by the workers as they become free, so only as many requests as the concurrency are held in memory at any point.
+    """
+
+    def __iter__(self) -> Iterator[RequestSpec]:
+        """Yields the requests in the order they have to be sent. Implemented by each scenario."""
+        raise NotImplementedError
+
+
+class JSONLScenario(Scenario):
+    """Replay of requests from a JSON lines file, that is read one line at a time.
+
+    >>> JSONLScenario
+
+    Each line is an object with ``method`` (defaults to ``get``) and ``url``, along with any keyword arguments for the
+    request, such as ``headers``, ``params``, ``json`` or ``data``. Blank lines are skipped.
+    """
+
+    def __init__(self, filename: str, loop: bool = False):
+        """Instantiates the members of the class.
+
+        Args:
+            filename: JSON lines file with a request on each line.
+            loop: Starts over from the first line, once the file is exhausted.
+        """
+        self.filename = filename
+        self.loop = loop
+
+    def _read(self) -> Iterator[RequestSpec]:
+        """Reads the file once, one line at a time."""
+        with open(self.filename) as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                yield RequestSpec(method=entry.pop('method', 'get').lower(), url=entry.pop('url'), kwargs=entry)
+
+    def __iter__(self) -> Iterator[RequestSpec]:
+        """Yields the requests from the file."""
+        while True:
+            yield from self._read()
+            if not self.loop:
+                return
+
+
+class HARScenario(Scenario):
+    """Replay of the requests recorded in an HTTP archive, as exported by the browsers and the proxies.
+
+    >>> HARScenario
+
+    See Also:
+        HAR is a single JSON document, so the archive is parsed as a whole, and each request is built as it is pulled.
+        Use :class:`JSONLScenario` to replay recordings that do not fit in memory.
+    """
+
+    def __init__(self, filename: str, loop: bool = False):
+        """Instantiates the members of the class.
+
+        Args:
+            filename: HAR file.
+            loop: Starts over from the first entry, once the archive is exhausted.
+        """
+        with open(filename) as file:
+            self.entries = json.load(file)['log']['entries']
+        self.loop = loop
+
+    @staticmethod
+    def _convert(entry: Dict[str, Any]) -> RequestSpec:
+        """Converts an entry in the archive into a request.
+
+        Args:
+            entry: Entry from the archive.
+
+        Returns:
+            RequestSpec:
+            Request with the method, url, headers and body of the entry.
+        """
+        request = entry['request']
+        kwargs = {'headers': {header['name']: header['value'] for header in request.get('headers', [])
+                              if not header['name'].startswith(':')
+                              and header['name'].lower() not in _SKIP_HEADERS}}
+        if (body := request.get('postData', {}).get('text')) is not None:
+            kwargs['data'] = body
+        return RequestSpec(method=request['method'].lower(), url=request['url'], kwargs=kwargs)
+
+    def __iter__(self) -> Iterator[RequestSpec]:
+        """Yields the requests from the archive."""
+        while True:
+            yield from map(self._convert, self.entries)
+            if not self.loop or not self.entries:
+                return
+
+
+class WeightedMix(Scenario):
+    """Weighted mix of endpoints, with templated URLs, headers and bodies.
+
+    >>> WeightedMix
+
+    Each endpoint is a dictionary with ``url``, ``method`` (defaults to ``get``), ``weight`` (defaults to 1), and any
+    keyword arguments for the request. Placeholders like ``{index}`` in the URL, or in any string within the keyword
+    arguments, are filled in for each request. ``index`` is the number of the request, and further placeholders are
+    filled from the functions in ``variables``. Literal braces have to be doubled.
+
+    Examples:
+        >>> WeightedMix(endpoints=[
+        ...     {'url': '/items/{item}', 'weight': 8},
+        ...     {'url': '/cart', 'method': 'post', 'json': {'item': '{item}'}, 'weight': 2},
+        ... ], variables={'item': lambda: random.randint(1, 10_000)})
+    """
+
+    def __init__(self, endpoints: List[Dict[str, Any]], variables: Dict[str, Callable[[], Any]] = None,
+                 total: int = None, seed: int = None):
+        """Instantiates the members of the class.
+
+        Args:
+            endpoints: Endpoints to pick from.
+            variables: Functions that return the value for each placeholder.
+            total: Number of requests to produce. Defaults to an endless mix.
+            seed: Seed for the random choice of endpoints, to produce the same sequence on every run.
+        """
+        if not endpoints:
+            raise ValueError("\n\nbad endpoints: []\n\nallowed: at least one endpoint")
+        self.endpoints = []
+        weights = []
+        for endpoint in endpoints:
+            endpoint = dict(endpoint)
+            weights.append(endpoint.pop('weight', 1))
+            self.endpoints.append(RequestSpec(method=endpoint.pop('method', 'get').lower(), url=endpoint.pop('url'),
+                                              kwargs=endpoint))
+        self.cum_weights = list(itertools.accumulate(weights))
+        self.variables = variables or {}
+        self.total = total
+        self.seed = seed
+
+    def _render(self, template: Any, values: Dict[str, Any]) -> Any:
+        """Fills in the placeholders within a template.
+
+        Args:
+            template: String, or a list or a dictionary with strings within.
+            values: Value for each placeholder.
+
+        Returns:
+            Any:
+            Template with the placeholders filled in.
+        """
+        if isinstance(template, str):
+            return template.format_map(values)
+        if isinstance(template, dict):
+            return {key: self._render(value, values) for key, value in template.items()}
+        if isinstance(template, list):
+            return [self._render(value, values) for value in template]
+        return template
+
+    def __iter__(self) -> Iterator[RequestSpec]:
+        """Yields the requests picked from the endpoints."""
+        generator = random.Random(self.seed)
+        indices = range(self.total) if self.total is not None else itertools.count()
+        for index in indices:
+            endpoint = generator.choices(self.endpoints, cum_weights=self.cum_weights)[0]
+            values = {name: function() for name, function in self.variables.items()}
+            values['index'] = index
+            yield RequestSpec(method=endpoint.method, url=endpoint.url.format_map(values),
+                              kwargs=self._render(endpoint.kwargs, values))
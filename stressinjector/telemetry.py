@@ -0,0 +1,275 @@
+import os
+import time
+from threading import Event, Lock
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy
+import psutil
+
+from .models import operating_system, settings
+
+if settings.os != operating_system.windows:
+    import resource
+
+# Columns of a cpu line in /proc/stat, excluding guest time which is already accounted in user and nice.
+_CPU_FIELDS = ('user', 'nice', 'system', 'idle', 'iowait', 'irq', 'softirq', 'steal')
+_IDLE, _IOWAIT, _STEAL = 3, 4, 7
+
+# Fields recorded by the memory sampler, along with the keys to read from /proc/self/smaps_rollup.
+_MEMORY_FIELDS = ('time', 'held', 'rss', 'uss', 'pss', 'swap', 'minor_faults', 'major_faults', 'available',
+                  'system_swap')
+_SMAPS_KEYS = {b'Rss': 'rss', b'Pss': 'pss', b'Swap': 'swap', b'Private_Clean': 'uss', b'Private_Dirty': 'uss',
+               b'Private_Hugetlb': 'uss'}
+
+
+class Sampler:
+    """Base for the samplers, that take a sample on a fixed schedule.
+
+    >>> Sampler
+
+    """
+
+    interval: float
+
+    def sample(self) -> Any:
+        """Takes a sample. Implemented by each sampler."""
+        raise NotImplementedError
+
+    def run(self, done: Event, callback: Callable[[Any], None] = None) -> None:
+        """Samples on a fixed schedule until the event is set.
+
+        Args:
+            done: Event that stops the sampling, once set.
+            callback: Function to call with each sample.
+        """
+        deadline = time.monotonic()
+        while True:
+            deadline += self.interval
+            if done.wait(max(deadline - time.monotonic(), 0)):
+                break
+            sample = self.sample()
+            if callback:
+                callback(sample)
+
+
+class CPUSampler(Sampler):
+    """Streaming sampler for the utilization of each logical core, that runs in constant memory.
+
+    >>> CPUSampler
+
+    Reads the tick counters from ``/proc/stat`` on Linux, and from ``psutil.cpu_times`` elsewhere. The utilization of
+    each interval is written into a fixed-size NumPy ring buffer, while min/mean/max and the share of steal and iowait
+    are accumulated for the whole run. The p50 and p95 are computed over the samples retained in the ring buffer.
+    """
+
+    def __init__(self, interval: float = 0.5, window: int = 600):
+        """Instantiates the members of the class and takes the first reading.
+
+        Args:
+            interval: Seconds between samples.
+            window: Number of samples to retain for the percentiles.
+        """
+        if interval <= 0:
+            raise ValueError(f"\n\nbad interval: {interval}\n\nallowed: greater than 0")
+        self.interval = interval
+        self.window = window
+        self.reset()
+
+    def reset(self) -> None:
+        """Discards the samples recorded so far, and takes a new first reading.
+
+        See Also:
+            Used to start the summary along with the stress, leaving out the samples of the lead-in.
+        """
+        self.cores, self._previous = self._read()
+        size = len(self.cores)
+        self.latest = numpy.zeros(size)
+        self.count = 0
+        self._buffer = numpy.zeros((self.window, size), dtype=numpy.float32)
+        self._min = numpy.full(size, numpy.inf)
+        self._max = numpy.zeros(size)
+        self._sum = numpy.zeros(size)
+        self._ticks = numpy.zeros((size, len(_CPU_FIELDS)))
+
+    @staticmethod
+    def _read() -> Tuple[List[int], numpy.ndarray]:
+        """Reads the cumulative tick counters for each logical core.
+
+        Returns:
+            tuple:
+            List of core numbers, and an array of counters with a row for each core.
+        """
+        if settings.os == operating_system.linux:
+            cores, rows = [], []
+            with open('/proc/stat', 'rb') as file:
+                for line in file:
+                    if line.startswith(b'cpu') and line[3:4].isdigit():
+                        fields = line.split()
+                        cores.append(int(fields[0][3:]))
+                        rows.append(fields[1:len(_CPU_FIELDS) + 1])
+            return cores, numpy.array(rows, dtype=numpy.float64)
+        times = psutil.cpu_times(percpu=True)
+        return list(range(len(times))), numpy.array([[getattr(core, field, 0.0) for field in _CPU_FIELDS]
+                                                     for core in times], dtype=numpy.float64)
+
+    def sample(self) -> Dict[int, float]:
+        """Takes a reading and records the utilization of each core since the previous one.
+
+        Returns:
+            Dict[int, float]:
+            Utilization percentage of each core.
+        """
+        _, current = self._read()
+        delta = current - self._previous
+        self._previous = current
+        total = delta.sum(axis=1)
+        busy = total - delta[:, _IDLE] - delta[:, _IOWAIT]
+        numpy.divide(busy * 100, total, out=self.latest, where=total > 0)
+        self._buffer[self.count % self.window] = self.latest
+        numpy.minimum(self._min, self.latest, out=self._min)
+        numpy.maximum(self._max, self.latest, out=self._max)
+        self._sum += self.latest
+        self._ticks += delta
+        self.count += 1
+        return dict(zip(self.cores, self.latest.round(1).tolist()))
+
+    def summary(self) -> Dict[int, Dict[str, float]]:
+        """Summarizes the samples recorded so far.
+
+        Returns:
+            Dict[int, Dict[str, float]]:
+            Min, mean, p50, p95, max utilization along with the steal and iowait percentages, for each core.
+        """
+        if not self.count:
+            return {}
+        retained = self._buffer[:min(self.count, self.window)]
+        p50, p95 = numpy.percentile(retained, [50, 95], axis=0)
+        total = self._ticks.sum(axis=1)
+        total[total == 0] = 1
+        steal = self._ticks[:, _STEAL] * 100 / total
+        iowait = self._ticks[:, _IOWAIT] * 100 / total
+        mean = self._sum / self.count
+        return {
+            core: {'min': round(float(self._min[row]), 2), 'mean': round(float(mean[row]), 2),
+                   'p50': round(float(p50[row]), 2), 'p95': round(float(p95[row]), 2),
+                   'max': round(float(self._max[row]), 2), 'steal': round(float(steal[row]), 2),
+                   'iowait': round(float(iowait[row]), 2)}
+            for row, core in enumerate(self.cores)
+        }
+
+
+class MemorySampler(Sampler):
+    """Live accounting of the memory used by the current process, and the memory available on the system.
+
+    >>> MemorySampler
+
+    Each sample records the RSS, USS, PSS and swap of the process from ``/proc/self/smaps_rollup`` on Linux (and from
+    ``psutil.Process.memory_full_info`` elsewhere), the minor and major page faults since the start, along with the
+    available memory and swap used on the system. Samples are retained in a fixed-size NumPy ring buffer.
+    """
+
+    def __init__(self, interval: float = 0.5, window: int = 7_200, held: Callable[[], int] = None):
+        """Instantiates the members of the class and takes the first reading.
+
+        Args:
+            interval: Seconds between samples.
+            window: Number of samples to retain in the time series.
+            held: Function that returns the number of bytes held by the stress.
+        """
+        if interval <= 0:
+            raise ValueError(f"\n\nbad interval: {interval}\n\nallowed: greater than 0")
+        self.interval = interval
+        self.window = window
+        self.held = held
+        self.count = 0
+        self._process = psutil.Process()
+        self._smaps = settings.os == operating_system.linux and os.path.isfile('/proc/self/smaps_rollup')
+        self._buffer = numpy.zeros(window, dtype=[(field, numpy.float64) for field in _MEMORY_FIELDS])
+        self._lock = Lock()  # samples are also taken outside of the schedule, from the thread that holds the memory
+        self._start = time.monotonic()
+        self._faults = self._read_faults()
+        self.latest = self.sample()
+
+    def _read_faults(self) -> Tuple[int, int]:
+        """Reads the cumulative page faults of the process.
+
+        Returns:
+            Tuple[int, int]:
+            Number of minor and major page faults.
+        """
+        if settings.os == operating_system.windows:
+            return self._process.memory_info().num_page_faults, 0
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return usage.ru_minflt, usage.ru_majflt
+
+    def _read_process(self) -> Dict[str, int]:
+        """Reads the memory used by the process.
+
+        Returns:
+            Dict[str, int]:
+            RSS, USS, PSS and swap in bytes.
+        """
+        if self._smaps:
+            values = {'rss': 0, 'uss': 0, 'pss': 0, 'swap': 0}
+            with open('/proc/self/smaps_rollup', 'rb') as file:
+                for line in file:
+                    key, _, rest = line.partition(b':')
+                    if field := _SMAPS_KEYS.get(key):
+                        values[field] += int(rest.split()[0]) * 1024
+            return values
+        info = self._process.memory_full_info()
+        return {'rss': info.rss, 'uss': info.uss, 'pss': getattr(info, 'pss', info.uss),
+                'swap': getattr(info, 'swap', 0)}
+
+    def sample(self) -> Dict[str, float]:
+        """Takes a reading and records it in the ring buffer.
+
+        Returns:
+            Dict[str, float]:
+            Values of each field in the sample.
+        """
+        with self._lock:
+            minor, major = self._read_faults()
+            values = self._read_process()
+            values.update(
+                time=round(time.monotonic() - self._start, 3), held=self.held() if self.held else 0,
+                minor_faults=minor - self._faults[0], major_faults=major - self._faults[1],
+                available=psutil.virtual_memory().available, system_swap=psutil.swap_memory().used
+            )
+            self._buffer[self.count % self.window] = tuple(values[field] for field in _MEMORY_FIELDS)
+            self.count += 1
+            self.latest = values
+            return values
+
+    def series(self) -> Dict[str, List[float]]:
+        """Returns the samples retained in the ring buffer, in chronological order.
+
+        Returns:
+            Dict[str, List[float]]:
+            List of values for each field.
+        """
+        size = min(self.count, self.window)
+        ordered = numpy.roll(self._buffer[:size], -(self.count % self.window) if self.count > self.window else 0)
+        return {field: ordered[field].tolist() for field in _MEMORY_FIELDS}
+
+    def summary(self) -> Dict[str, float]:
+        """Summarizes the samples retained so far.
+
+        Returns:
+            Dict[str, float]:
+            Peak RSS, USS, PSS and swap, the lowest available memory and the page faults along with their peak rate.
+        """
+        retained = self._buffer[:min(self.count, self.window)]
+        if not retained.size:
+            return {}
+        elapsed = numpy.diff(retained['time'])
+        elapsed[elapsed == 0] = self.interval
+        return {
+            'peak_rss': int(retained['rss'].max()), 'peak_uss': int(retained['uss'].max()),
+            'peak_pss': int(retained['pss'].max()), 'peak_swap': int(retained['swap'].max()),
+            'min_available': int(retained['available'].min()),
+            'peak_system_swap': int(retained['system_swap'].max()),
+            'minor_faults': int(self.latest['minor_faults']), 'major_faults': int(self.latest['major_faults']),
+            'peak_minor_fault_rate': float((numpy.diff(retained['minor_faults']) / elapsed).max(initial=0)),
+            'peak_major_fault_rate': float((numpy.diff(retained['major_faults']) / elapsed).max(initial=0)),
+        }
@@ -1,41 +1,89 @@
 import logging
+import math
+import multiprocessing
+import pickle
+import queue
 import time
 import urllib.parse
 import warnings
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from threading import Event
-from typing import Union
+from itertools import islice
+from multiprocessing import Process
+from threading import Event, Thread
+from typing import Any, Dict, Type, Union
 
 import requests
 
-from .models import LOGGER, RequestType
+from .client import prepare
+from .controller import Controller
+from .engines import AsyncEngine, Engine, ThreadEngine, publish
+from .helper import size_converter
+from .models import ArrivalType, EngineType, RequestType
+from .results import Results
+from .scenario import Scenario
 
 
-class URLStress:
-    """Controller for URL stress using threadpool. Gets url as input.
+class URLStress(Controller):
+    """Controller for URL stress using worker threads or asyncio. Gets url as input.
 
     >>> URLStress
 
+    The number of concurrent requests is bounded by ``concurrency``, independent of the total number of requests. Each
+    worker reuses a keep-alive connection, either from its own ``requests.Session`` with the ``thread`` engine, or from
+    a coroutine on a single event loop with the ``asyncio`` engine.
+
+    With ``processes`` greater than 1, the requests and the concurrency are split across worker processes, each running
+    its own engine, so the load scales with the number of cores instead of being bound by the GIL. The results of each
+    process are sent back to the parent and merged into a single report. A scenario is read once by the parent, and its
+    requests are fed to the processes in batches, so only the requests have to be picklable.
+
+    By default, ``rate`` requests are sent as fast as the workers allow, which is a closed model where a slow response
+    also delays the next request, optionally time-boxed by a ``duration``. With ``duration`` and ``rps``, requests are
+    due on an arrival clock instead, at a constant interval or as a Poisson process, independent of the response times.
+    Latency is then measured from the time each request was due, to correct for coordinated omission, and the achieved
+    rate is reported against the requested rate, along with the lag of each send, to tell when the generator itself fell
+    behind.
+
+    With a :class:`~stressinjector.scenario.Scenario`, the requests are pulled lazily from a JSON lines file, an HTTP
+    archive or a weighted mix of endpoints, instead of sending the same request each time. Relative URLs are resolved
+    against ``url``. The run ends when the scenario is exhausted, or when the ``rate`` or the ``duration`` is reached,
+    whichever comes first.
+
+    Runs to completion on instantiation by default. With ``blocking=False``, it can be started, stopped and awaited in
+    the background, using the API from :class:`~stressinjector.controller.Controller`.
     """
 
-    RESULT = {'success': 0, 'errors': 0}
-    EVENT = Event()
+    BATCH = 64  # requests of a scenario fed to the processes at a time
+    PROGRESS = 1.0  # seconds between the responses sent by each process, to publish them as they come in
 
     def __init__(self, url: str, rate: int = 1e+5, timeout: Union[int, float] = None,
                  logger: logging.Logger = None, request_type: str = RequestType.get,
-                 **kwargs):
+                 concurrency: int = 64, engine: str = EngineType.thread, processes: int = 1,
+                 duration: float = None, rps: float = None, arrival: str = ArrivalType.uniform,
+                 scenario: Scenario = None, phases: bool = False, discard_body: bool = False,
+                 blocking: bool = True, **kwargs):
         """Instantiate the object, parse and validate the URL.
 
         Args:
             url: URL to inject stress.
             rate: Number of calls to make.
             timeout: Timeout for each request.
-            retry_limit: Retry limit if the system is unable to spinup more threads.
-            circuit_break: Wait time in seconds between retries.
             logger: Custom logger.
             request_type: Function from ``requests`` module.
+            concurrency: Maximum number of requests in flight. Defaults to 64.
+            engine: Engine that sends the requests. Defaults to worker threads.
+            processes: Number of processes to shard the requests across. Defaults to 1.
+            duration: Seconds to send requests for, at the arrival rate of ``rps``, which takes precedence over
+                ``rate``. Without ``rps``, requests are sent as fast as the concurrency allows, until the duration
+                runs out or ``rate`` requests were sent.
+            rps: Requests per second to schedule, independent of the response times.
+            arrival: Arrival process for ``rps``, constant interval with ``uniform`` or ``poisson``.
+            scenario: Scenario to pull the requests from.
+            phases: Records the time spent on DNS, connect, TLS, time to first byte and body separately.
+            discard_body: Streams the response bodies and discards them without decoding, with the thread engine.
+            blocking: Runs the stress on instantiation when ``True``, otherwise waits for ``start()``.
             kwargs: Keyword arguments to use in the request.
         """
+        super().__init__(logger=logger)
         self.parsed = urllib.parse.urlparse(url=url, allow_fragments=True)
         if self.parsed.scheme not in ('http', 'https', 'ws', 'ftp', 'tcp', 'udp', 'ssh',
                                       'gopher', 'mailto', 'news', 'telnet', 'file', 'nntp', 'wais'):
@@ -46,69 +94,231 @@ class URLStress:
             raise ValueError(
                 f"\n\nbad request type: {request_type}\n\nallowed: {', '.join(RequestType.__members__.keys())}"
             )
-        self.LOGGER = logger or LOGGER
+        if engine not in EngineType.__members__.keys():
+            raise ValueError(
+                f"\n\nbad engine: {engine}\n\nallowed: {', '.join(EngineType.__members__.keys())}"
+            )
+        if rps is not None and duration is None:
+            raise ValueError(
+                f"\n\nbad open model: duration={duration}, rps={rps}\n\nallowed: duration along with rps"
+            )
+        if (duration is not None and duration <= 0) or (rps is not None and rps <= 0):
+            raise ValueError(
+                f"\n\nbad duration or rps: duration={duration}, rps={rps}\n\nallowed: greater than 0"
+            )
+        if arrival not in ArrivalType.__members__.keys():
+            raise ValueError(
+                f"\n\nbad arrival: {arrival}\n\nallowed: {', '.join(ArrivalType.__members__.keys())}"
+            )
+        self.engine = EngineType(engine)
+        if self.engine == EngineType.asyncio:
+            prepare(request_type, url, **kwargs)  # validates the keyword arguments and the scheme upfront
         self.request_url = url
-        self.request_rate = int(rate)
+        self.duration = duration
+        self.rps = rps
+        self.arrival = ArrivalType(arrival)
+        self.scenario = scenario
+        self.phases = phases
+        self.discard_body = discard_body
+        self.request_rate = math.ceil(duration * rps) if rps else int(rate)
         self.timeout = timeout
         self.kwargs = kwargs or {}
         self.request_type = request_type
-        self._run()
+        self.concurrency = max(int(concurrency), 1)
+        self.processes = max(min(int(processes), self.request_rate), 1)
+        if self.processes > 1 and scenario is not None:
+            try:
+                pickle.dumps(next(iter(scenario), None))
+            except Exception as error:
+                raise ValueError(f"\n\nbad scenario: requests cannot be sent to the processes\n\n{error}") from error
+        self.RESULT = {'success': 0, 'errors': 0}
+        self.results = Results()
+        if blocking:
+            self._run()
 
     def make_request(self, sample: bool = False) -> None:
-        """Makes a GET request to the endpoint.
+        """Makes a GET request to the endpoint, or the first request of the scenario.
 
         Args:
             sample: Boolean flag to indicate if the request is sample.
         """
-        if self.EVENT.is_set():
+        if self._stop_event.is_set():
             return
+        method, url, kwargs = self.request_type.lower(), self.request_url, self.kwargs
+        if self.scenario is not None and (first := next(iter(self.scenario), None)):
+            method, url, kwargs = first.method, urllib.parse.urljoin(self.request_url, first.url), first.kwargs
         if sample:
-            response = requests.request(method=self.request_type.lower(), url=self.request_url, **self.kwargs)
+            response = requests.request(method=method, url=url, **kwargs)
         else:
-            response = requests.request(method=self.request_type.lower(), url=self.request_url,
-                                        timeout=self.timeout, **self.kwargs)
+            response = requests.request(method=method, url=url, timeout=self.timeout, **kwargs)
         if response.ok:
             return
         else:
             response.raise_for_status()
 
+    def _feed(self, feed: multiprocessing.Queue, done: Event) -> None:
+        """Reads the scenario once, and feeds its requests to the processes in batches.
+
+        Args:
+            feed: Bounded queue the processes take the batches from.
+            done: Event that stops the feed, once all the processes are done.
+
+        See Also:
+            The feed ends with a ``None`` for each process, once the scenario is exhausted or a stop is requested.
+        """
+        def put(item: Any) -> bool:
+            """Puts an item in the queue as soon as there is room, unless the processes are done."""
+            while not done.is_set():
+                try:
+                    feed.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        specs = iter(self.scenario)
+        try:
+            while not self._stop_event.is_set() and (batch := list(islice(specs, self.BATCH))):
+                if not put(batch):
+                    return
+        except Exception as error:
+            self.LOGGER.error("scenario failed with '%s', no more requests are sent", error)
+        for _ in range(self.processes):
+            if not put(None):
+                return
+
+    @classmethod
+    def _shard(cls, engine_class: Type[Engine], settings: Dict[str, Any], results: multiprocessing.Queue) -> None:
+        """Runs an engine on a share of the requests, and sends its progress and its results to the parent process.
+
+        Args:
+            engine_class: Engine to run.
+            settings: Keyword arguments for the engine.
+            results: Queue to put the progress and the results in, tagged with ``progress`` and ``done``.
+
+        See Also:
+            The responses received since the previous send are sent every ``PROGRESS`` seconds, along with a last send
+            before the results, so the parent process can publish them as they come in.
+        """
+        engine = engine_class(**settings)
+        finished = Event()
+
+        def report() -> None:
+            """Sends the progress of the engine on a fixed schedule, until it is finished."""
+            while not finished.wait(cls.PROGRESS):
+                results.put(('progress', engine.progress()))
+
+        reporter = Thread(target=report, daemon=True)
+        reporter.start()
+        try:
+            result = engine.run()
+        except KeyboardInterrupt:
+            result = Results()
+        finished.set()
+        reporter.join()
+        results.put(('progress', engine.progress()))
+        results.put(('done', result))
+
+    def _run_sharded(self, engine_class: Type[Engine], settings: Dict[str, Any]) -> Results:
+        """Splits the requests and the concurrency across the processes, and merges their results.
+
+        Args:
+            engine_class: Engine to run in each process.
+            settings: Keyword arguments for the engine, except the share of requests and concurrency.
+
+        Returns:
+            Results:
+            Results of all the processes merged together.
+        """
+        stop = multiprocessing.Event()
+        results = multiprocessing.Queue()
+        done, feed, feeder = Event(), None, None
+        if self.scenario is not None:
+            feed = multiprocessing.Queue(maxsize=4 * self.processes)
+            feeder = Thread(target=self._feed, args=(feed, done), daemon=True)
+            settings = dict(settings, scenario=None, feed=feed)
+        processes = []
+        for index in range(self.processes):
+            share = dict(settings, stop=stop, live_metrics=False,
+                         total=self.request_rate // self.processes + (index < self.request_rate % self.processes),
+                         concurrency=self.concurrency // self.processes + (index < self.concurrency % self.processes))
+            processes.append(Process(target=self._shard, args=(engine_class, share, results), daemon=True))
+        [process.start() for process in processes]
+        if feeder:
+            feeder.start()
+        merged = Results()
+        pending = len(processes)
+        while pending:
+            if self._stop_event.is_set():
+                stop.set()
+            try:
+                kind, result = results.get(timeout=0.1)
+            except queue.Empty:
+                if not any(process.is_alive() for process in processes):
+                    self.LOGGER.error("%d process(es) exited without results", pending)
+                    break
+                continue
+            if kind == 'progress':
+                publish(url=settings['url'], results=result)
+            else:
+                merged.merge(result)
+                pending -= 1
+        done.set()
+        if feeder:
+            feeder.join()
+            # batches left behind by the processes would otherwise hold up the exit of this process
+            feed.cancel_join_thread()
+        [process.join(timeout=5) for process in processes]
+        [process.terminate() for process in processes if process.is_alive()]
+        return merged
+
     def initiate_injection(self) -> bool:
-        """Initiates injection in a thread pool.
+        """Initiates injection with a fixed number of workers, each with its own keep-alive connection.
 
         Returns:
             bool:
             Returns a boolean flag based on successful completion.
         """
-        futures = {}
-        executor = ThreadPoolExecutor(max_workers=self.request_rate)
-        with executor:
-            for iterator in range(1, int(self.request_rate) + 1):
-                try:
-                    future = executor.submit(self.make_request)
-                    futures[future] = iterator
-                except RuntimeError as error:
-                    self.LOGGER.error(error)
-                    self.LOGGER.warning("cancelling future tasks")
-                    future.cancel()
-                    self.EVENT.set()
-                    total = len(futures)
-                    returned = sum(self.RESULT.values())
-                    self.LOGGER.warning("calls made: %d", f'{total:,}')
-                    self.LOGGER.warning("calls completed: %d", f'{returned:,}')
-                    self.LOGGER.warning("calls pending: %d", f'{total - returned:,}')
-                    self.LOGGER.warning("awaiting pending tasks to complete")
-                    return False
-        for future in as_completed(futures):
-            if future.exception():
-                self.LOGGER.error("thread processing for '%s' received an exception: '%s'",
-                                  iterator, future.exception())
-                self.RESULT['errors'] += 1
-            else:
-                self.RESULT['success'] += 1
+        engine_class = AsyncEngine if self.engine == EngineType.asyncio else ThreadEngine
+        settings = dict(method=self.request_type.lower(), url=self.request_url, timeout=self.timeout,
+                        logger=self.LOGGER, duration=self.duration, arrival=self.arrival.value, scenario=self.scenario,
+                        phases=self.phases, discard_body=self.discard_body, **self.kwargs)
+        if self.processes > 1:
+            results = self._run_sharded(engine_class=engine_class,
+                                        settings=dict(settings, rps=self.rps / self.processes if self.rps else None))
+        else:
+            results = engine_class(total=self.request_rate, concurrency=self.concurrency, stop=self._stop_event,
+                                   rps=self.rps, **settings).run()
+        self.results = results
+        self.RESULT.update(success=results.success, errors=results.errors)
+        if self._stop_event.is_set():
+            self.LOGGER.warning("stop requested, pending requests were not sent")
+            return False
         return True
 
+    def _print_report(self) -> None:
+        """Prints the latency distribution, along with the counts by status code and by exception type."""
+        latency = self.report['latency']
+        if latency['count']:
+            print('Latency (ms) - ' + ' - '.join(f"{name}: {latency[name]}"
+                                                 for name in ('min', 'p50', 'p90', 'p99', 'p99.9', 'max')))
+        print(f"Throughput - {self.report['throughput']} requests/s - {size_converter(self.report['bytes'])} received")
+        if self.rps:
+            lag = self.report['lag']
+            print(f"Arrival rate - requested: {self.report['requested_rps']} - achieved: {self.report['achieved_rps']} "
+                  f"- lag p99: {lag['p99']} ms - lag max: {lag['max']} ms")
+        for phase, latency in self.report.get('phases', {}).items():
+            print(f"Phase {phase} (ms) - p50: {latency['p50']} - p99: {latency['p99']} - max: {latency['max']}")
+        for status, count in self.report['status'].items():
+            print(f"Status {status} - {count:,}")
+        for kind, count in self.report['exceptions'].items():
+            print(f"{kind} - {count:,}")
+
     def _run(self) -> None:
         """Runs initiate request injection and prints success and error count."""
+        self.RESULT = {'success': 0, 'errors': 0}
+        self.results = Results()
+        self.report = {}
         try:
             self.LOGGER.info("Initiating sample call")
             self.make_request(sample=True)  # at least one request should pass before initiating request injection
@@ -118,13 +328,37 @@ class URLStress:
                 f"\n{error.__str__()}\n\ntest call failed, cannot proceed stress testing\n"
             )
             return
-        self.LOGGER.info("Running request injection on '%s' with rate %s", self.parsed.netloc, f'{self.request_rate:,}')
+        if self.rps:
+            self.LOGGER.info("Running request injection on '%s' at %s requests/s with %s arrivals for %s seconds, "
+                             "concurrency %d using %s engine in %d process(es)", self.parsed.netloc, f'{self.rps:,}',
+                             self.arrival.value, self.duration, self.concurrency, self.engine.value, self.processes)
+        elif self.duration:
+            self.LOGGER.info("Running request injection on '%s' for %s seconds with concurrency %d using %s engine "
+                             "in %d process(es)", self.parsed.netloc, self.duration, self.concurrency,
+                             self.engine.value, self.processes)
+        else:
+            self.LOGGER.info("Running request injection on '%s' with rate %s and concurrency %d using %s engine "
+                             "in %d process(es)", self.parsed.netloc, f'{self.request_rate:,}', self.concurrency,
+                             self.engine.value, self.processes)
         start = time.time()
         run_assert = self.initiate_injection()
-        self.LOGGER.info("Request injection completed in %f seconds", round(float(time.time() - start), 2))
+        run_time = time.time() - start
+        self.report = dict(self.results.summary(), engine=self.engine.value, processes=self.processes,
+                           run_time=round(run_time, 3),
+                           throughput=round((self.results.success + self.results.errors) / run_time, 2))
+        if self.rps:
+            self.report.update(arrival=self.arrival.value, requested_rps=self.rps,
+                               achieved_rps=round(self.results.lag.count / max(run_time, self.duration), 2))
+            self.report.setdefault('lag', self.results.lag.summary())
+        self.LOGGER.info("Request injection completed in %f seconds", round(float(run_time), 2))
+        self._print_report()
         self.LOGGER.info("Total number of requests passed: %d", self.RESULT['success'])
         self.LOGGER.warning("Total number of requests failed: %d", self.RESULT['errors'])
-        if run_assert:
-            assert sum(self.RESULT.values()) == self.request_rate, "Not all request trails were successful"
-        else:
+        if self.rps:
+            if run_assert and self.report['achieved_rps'] < self.rps * 0.95:
+                self.LOGGER.warning("Generator fell behind, achieved %s of the requested %s requests/s. Increase the "
+                                    "concurrency or the processes", self.report['achieved_rps'], self.rps)
+        elif not run_assert:
             self.LOGGER.warning("Total number of requests abandoned: %d", self.request_rate - sum(self.RESULT.values()))
+        elif self.scenario is None and self.duration is None:
+            assert sum(self.RESULT.values()) == self.request_rate, "Not all request trails were successful"